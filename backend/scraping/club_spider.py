@@ -1,17 +1,179 @@
-from spider import Spider
+import hashlib
+import json
+import os
+import re
+import threading
+from html import unescape
+from urllib.parse import urlencode
 
+from pymongo import UpdateOne
+
+from backend.scraping.spider import Spider, Request, CrawlEngine
+from backend.server.schemas.club import Club
+from backend.server.schemas.schedule import Schedule
+
+# Descriptions come back as html, the Club schema stores plain text
+def strip_html(html):
+    return " ".join(unescape(re.sub(r"<[^>]+>", " ", html)).split())
+
+# Crawls the campus organization directory (a CampusLabs Engage site). The listing is paged
+# through the discovery search API, and only clubs whose listing entry changed since the last
+# crawl have their detail fetched and written, so a re-crawl of an unchanged directory costs
+# one conditional request per listing page.
+# Run from the repository root so the server's schemas can be imported:
+#   python -m backend.scraping.club_spider
 class ClubsSpider(Spider):
-    def __init__(self):
-        super().__init__("https://my.uhds.oregonstate.edu/api/drupal/hours")
+    IMAGE_URL = "https://se-images.campuslabs.com/clink/images/{}?preset=med-sq"
+
+    def __init__(self, base_url="https://beaverconnect.oregonstate.edu", college="Oregon State University", page_size=100, state_file=".club_crawl_state.json"):
+        super().__init__(base_url)
+        self.college = college
+        self.page_size = page_size
+        self.state_file = state_file
+
+        # Listing page validators, the directory size and a fingerprint of every club's listing
+        # entry, as of the last crawl that saved successfully
+        self.state = self.load_state()
+        self.lock = threading.Lock()
+        self.waiting = {}       # listing url -> ids of its changed clubs not saved yet
+        self.new_etags = {}     # listing url -> validator to store once its clubs are saved
+        self.new_fingerprints = {}
+
+        self.stats = {"pages": 0, "pages_not_modified": 0, "clubs_listed": 0, "clubs_changed": 0, "upserted": 0, "modified": 0}
+
+    def load_state(self):
+        try:
+            with open(self.state_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"total": None, "etags": {}, "fingerprints": {}}
+
+    def save_state(self):
+        tmp = f"{self.state_file}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.state_file)
+
+    def listing_url(self, skip):
+        query = urlencode({"orderBy[0]": "UpperName asc", "top": self.page_size, "skip": skip, "filter": "", "query": ""})
+        return f"{self.url}/api/discovery/search/organizations?{query}"
+
+    def listing_request(self, skip):
+        url = self.listing_url(skip)
+        etag = self.state["etags"].get(url)
+        headers = {"Accept": "application/json"}
+        if etag:
+            headers["If-None-Match"] = etag
+        return Request(url, callback=self.parse, meta={"skip": skip}, headers=headers)
 
     def start_requests(self):
-        # Logic specific to starting requests for the clubs website
-        pass
+        yield self.listing_request(0)
 
     def parse(self, response):
-        # Parsing logic specific to the clubs website
-        pass
+        self.stats["pages"] += 1
+        skip = response.meta["skip"]
+
+        if response.status == 304:
+            self.stats["pages_not_modified"] += 1
+            total = self.state["total"]
+        else:
+            data = response.json()
+            total = data.get("@odata.count", 0)
+            yield from self.parse_listing(response, data.get("value", []))
+
+        # The first page says how big the directory is, the rest are requested at once so
+        # the engine can fetch them concurrently
+        if skip == 0:
+            self.state["total"] = total
+            for next_skip in range(self.page_size, total or 0, self.page_size):
+                yield self.listing_request(next_skip)
+
+    def parse_listing(self, response, organizations):
+        changed = set()
+        for organization in organizations:
+            self.stats["clubs_listed"] += 1
+            club_id = str(organization["Id"])
+            fingerprint = hashlib.sha256(json.dumps(organization, sort_keys=True).encode()).hexdigest()
+            if self.state["fingerprints"].get(club_id) == fingerprint:
+                continue
+
+            self.stats["clubs_changed"] += 1
+            changed.add(club_id)
+            self.new_fingerprints[club_id] = fingerprint
+            yield Request(f"{self.url}/api/discovery/organization/{club_id}", callback=self.parse_detail, headers={"Accept": "application/json"})
+
+        with self.lock:
+            self.waiting[response.url] = changed
+            self.new_etags[response.url] = response.headers.get("ETag")
+
+    def parse_detail(self, response):
+        data = response.json()
+        address = next(iter(data.get("ContactInfo") or []), {}) or {}
+        location = ", ".join(part for part in (address.get("Street1"), address.get("City"), address.get("State")) if part)
+        website = (data.get("SocialMedia") or {}).get("ExternalWebsite") or f"{self.url}/organization/{data.get('WebsiteKey', '')}"
+
+        club = Club(
+            name=data["Name"].strip(),
+            image=self.IMAGE_URL.format(data["ProfilePicture"]) if data.get("ProfilePicture") else "",
+            admins=[],
+            schedule=Schedule(days=[]),
+            location=location,
+            link=website,
+            description=strip_html(data.get("Description") or data.get("Summary") or ""),
+            college=self.college
+        )
+        yield (str(data["Id"]), club)
+
+    # Upserts a batch of crawled clubs by name in one round trip. The crawl owns the directory
+    # fields; admins, schedule and the review section are only set when a club is first created
+    def save_to_db(self, database, items):
+        operations = []
+        for _, club in items:
+            operations.append(UpdateOne({"name": club.name}, {
+                # search_name is the lowercased name the server's /search prefix-matches on
+                "$set": {**club.model_dump(include={"name", "image", "location", "link", "description", "college"}), "search_name": club.name.casefold()},
+                "$setOnInsert": {
+                    "admins": [],
+                    "schedule": club.schedule.model_dump(),
+                    "reviews": {"score": 0, "count": 0, "total": 0, "hidden": False}
+                }
+            }, upsert=True))
+
+        # A dry run (no database) must not record anything as saved, or the next real crawl
+        # would skip these clubs as unchanged
+        if database is None:
+            return
+        result = database.clubs.bulk_write(operations, ordered=False)
+        self.stats["upserted"] += result.upserted_count
+        self.stats["modified"] += result.modified_count
+        # Invalidates the server's cached /club/ responses when it runs with
+        # RESPONSE_CACHE_SHARED (otherwise they expire on their own)
+        if result.upserted_count or result.modified_count:
+            database.cache_versions.update_one({"_id": database.clubs.name}, {"$inc": {"version": 1}}, upsert=True)
+
+        with self.lock:
+            for club_id, _ in items:
+                self.state["fingerprints"][club_id] = self.new_fingerprints.pop(club_id)
+                for ids in self.waiting.values():
+                    ids.discard(club_id)
+
+    # A listing page's validator is only kept once every changed club on it was saved, so a
+    # failed detail fetch is retried on the next crawl instead of hiding behind a 304
+    def closed(self, stats):
+        for url, ids in self.waiting.items():
+            if not ids and self.new_etags.get(url):
+                self.state["etags"][url] = self.new_etags[url]
+            else:
+                self.state["etags"].pop(url, None)
+        self.save_state()
+
+if __name__ == "__main__":
+    from pymongo import MongoClient
+    from dotenv import dotenv_values
+
+    config = dotenv_values(".env")
+    database = MongoClient(config["MONGODB_CONNECTSTR"]).campusview
 
-    def save_to_db(self, database):
-        # Save the data to the database
-        pass
+    spider = ClubsSpider()
+    stats = CrawlEngine([spider], database=database).run()
+    print({**stats, **spider.stats})
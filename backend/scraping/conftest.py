@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The club crawler is run as a module from the repository root (python -m
+# backend.scraping.club_spider), so its tests import it from there too
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+# Serves sites for the crawl engine and spider tests on localhost from a background thread.
+# routes maps a path to a function of the parsed query string that returns the body to send
+# (str, bytes, or anything else as JSON) or None for a 404. failures maps a path to statuses to
+# answer it with first, one per request, before it is served normally. Bodies carry ETags and
+# a matching If-None-Match gets a 304 unless etags is turned off. The server records every
+# request path and the most requests it was handling at once.
+class FixtureServer:
+    def __init__(self, routes: dict, delay: float = 0.0):
+        self.routes = routes
+        self.delay = delay
+        self.failures = {}
+        self.etags = True
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with fixture.lock:
+                    fixture.requests.append(self.path)
+                    fixture.in_flight += 1
+                    fixture.max_in_flight = max(fixture.max_in_flight, fixture.in_flight)
+                try:
+                    time.sleep(fixture.delay)
+                    fixture.respond(self)
+                finally:
+                    with fixture.lock:
+                        fixture.in_flight -= 1
+
+        self.server = ThreadingHTTPServer(("localhost", 0), Handler)
+        self.base_url = f"http://localhost:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def respond(self, handler):
+        url = urlsplit(handler.path)
+        with self.lock:
+            failures = self.failures.get(url.path)
+            status = failures.pop(0) if failures else None
+        if status is not None:
+            handler.send_response(status)
+            handler.send_header("Content-Length", "0")
+            handler.end_headers()
+            return
+
+        route = self.routes.get(url.path)
+        body = route({key: values[0] for key, values in parse_qs(url.query).items()}) if route else None
+        if body is None:
+            handler.send_response(404)
+            handler.send_header("Content-Length", "0")
+            handler.end_headers()
+            return
+
+        content_type = "text/html; charset=utf-8"
+        if isinstance(body, str):
+            body = body.encode()
+        elif not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+            content_type = "application/json"
+
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        if self.etags and handler.headers.get("If-None-Match") == etag:
+            handler.send_response(304)
+            handler.send_header("ETag", etag)
+            handler.end_headers()
+            return
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(body)))
+        if self.etags:
+            handler.send_header("ETag", etag)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def requests_to(self, prefix: str) -> list[str]:
+        return [path for path in self.requests if path.startswith(prefix)]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+# A CampusLabs Engage organization directory of count clubs, served by FixtureServer through
+# the discovery search and organization routes ClubsSpider reads. Each club's detail is its
+# listing entry plus the fields only the detail carries, so changing a listing entry changes
+# what the spider writes.
+class EngageDirectory:
+    def __init__(self, count: int = 450):
+        self.organizations = [
+            {"Id": 1000 + i, "Name": f"Club {i:03}", "ProfilePicture": f"club{i}.png", "Summary": f"Summary of club {i}",
+             "CategoryNames": ["Academic"], "WebsiteKey": f"club-{i}"}
+            for i in range(count)
+        ]
+
+    def search(self, query: dict) -> dict:
+        skip, top = int(query.get("skip", 0)), int(query.get("top", 10))
+        return {"@odata.count": len(self.organizations), "value": self.organizations[skip:skip + top]}
+
+    def detail(self, i: int) -> dict:
+        organization = self.organizations[i]
+        return {
+            **organization,
+            "Description": f"<p>All about club {i} &amp; its members</p>",
+            "ContactInfo": [{"Street1": f"{i} Jefferson Way", "City": "Corvallis", "State": "OR"}],
+            "SocialMedia": {"ExternalWebsite": ""}
+        }
+
+    def routes(self) -> dict:
+        routes = {"/api/discovery/search/organizations": self.search}
+        for i, organization in enumerate(self.organizations):
+            routes[f"/api/discovery/organization/{organization['Id']}"] = lambda query, i=i: self.detail(i)
+        return routes
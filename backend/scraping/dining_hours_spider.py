@@ -12,6 +12,6 @@ class DiningSpider(Spider):
         # Parsing logic specific to the dining hours website
         pass
 
-    def save_to_db(self, database):
+    def save_to_db(self, database, items):
         # Save the data to the database
         pass
@@ -12,6 +12,6 @@ class MenuSpider(Spider):
         # Parsing logic specific to the menu website
         pass
 
-    def save_to_db(self, database):
+    def save_to_db(self, database, items):
         # Save the data to the database
         pass
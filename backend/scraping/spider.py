@@ -1,17 +1,194 @@
 from abc import ABC, abstractmethod
+import asyncio
+import json
+import random
+import time
+from urllib.parse import urldefrag
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# A page to fetch, and the spider method that should parse it
+class Request:
+    def __init__(self, url, callback=None, meta=None, headers=None, dont_filter=False):
+        self.url = url
+        self.callback = callback
+        self.meta = meta or {}
+        self.headers = headers
+        self.dont_filter = dont_filter   # fetch even if the url was already seen
+        self.retries = 0
+
+# What a spider's parse callbacks receive
+class Response:
+    def __init__(self, request, status, headers, content, encoding):
+        self.url = request.url
+        self.request = request
+        self.meta = request.meta
+        self.status = status
+        self.headers = headers
+        self.content = content
+        self.encoding = encoding or "utf-8"
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
 
 class Spider(ABC):
     def __init__(self, url):
         self.url = url
 
+    # Yields the first Requests (or plain urls) to crawl
     @abstractmethod
     def start_requests(self):
         pass
 
+    # Yields items to save and/or further Requests to crawl
     @abstractmethod
     def parse(self, response):
         pass
 
+    # Writes a batch of items yielded by parse
     @abstractmethod
-    def save_to_db(self, database):
-        pass
\ No newline at end of file
+    def save_to_db(self, database, items):
+        pass
+
+    # Called once every request has finished and every batch is saved
+    def closed(self, stats):
+        pass
+
+# Runs any number of spiders at once. Requests from every spider share one queue and one
+# pooled HTTP session, urls a spider already requested are skipped, failed requests are
+# retried with exponential backoff, and items go to each spider's save_to_db in batches.
+class CrawlEngine:
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, spiders, database=None, concurrency=8, max_retries=3, backoff=0.5, batch_size=100, timeout=30):
+        self.spiders = spiders
+        self.database = database
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.batch_size = batch_size
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(spiders) or 1, pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.seen = set()
+        self.pending = {}       # spider -> items waiting to be saved
+        self.stats = {"requests": 0, "responses": 0, "retries": 0, "failed": 0, "duplicates": 0, "items": 0, "saved": 0,
+                      "save_failures": 0, "unsaved": 0}
+
+    def run(self):
+        return asyncio.run(self.crawl())
+
+    async def crawl(self):
+        start = time.perf_counter()
+        queue = asyncio.Queue()
+        for spider in self.spiders:
+            self.pending[spider] = []
+            for request in spider.start_requests() or []:
+                self.enqueue(queue, spider, request)
+
+        workers = [asyncio.create_task(self.worker(queue)) for _ in range(self.concurrency)]
+        await queue.join()
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+        for spider in self.spiders:
+            await self.flush(spider)
+            self.stats["unsaved"] += len(self.pending[spider])
+
+        seconds = time.perf_counter() - start
+        self.stats["seconds"] = round(seconds, 3)
+        self.stats["requests_per_second"] = round(self.stats["responses"] / seconds, 1) if seconds else 0
+        self.stats["items_per_second"] = round(self.stats["saved"] / seconds, 1) if seconds else 0
+        for spider in self.spiders:
+            spider.closed(self.stats)
+        return self.stats
+
+    def enqueue(self, queue, spider, request):
+        if isinstance(request, str):
+            request = Request(request)
+        key = (spider, urldefrag(request.url)[0])
+        if not request.dont_filter:
+            if key in self.seen:
+                self.stats["duplicates"] += 1
+                return
+            self.seen.add(key)
+        queue.put_nowait((spider, request))
+
+    async def worker(self, queue):
+        while True:
+            spider, request = await queue.get()
+            try:
+                await self.process(queue, spider, request)
+            except Exception as e:
+                print(f"{type(spider).__name__} failed on {request.url}: {e}")
+                self.stats["failed"] += 1
+            finally:
+                queue.task_done()
+
+    async def process(self, queue, spider, request):
+        response = await self.fetch(request)
+        if response is None:
+            return
+
+        callback = request.callback or spider.parse
+        for result in callback(response) or []:
+            if isinstance(result, (Request, str)):
+                self.enqueue(queue, spider, result)
+            else:
+                self.pending[spider].append(result)
+                self.stats["items"] += 1
+                if len(self.pending[spider]) >= self.batch_size:
+                    await self.flush(spider)
+
+    # Fetches in a worker thread so the blocking session never stalls the event loop
+    async def fetch(self, request):
+        while True:
+            self.stats["requests"] += 1
+            try:
+                raw = await asyncio.to_thread(self.session.get, request.url, headers=request.headers, timeout=self.timeout)
+                if raw.status_code not in self.RETRY_STATUSES:
+                    raw.raise_for_status()
+                    self.stats["responses"] += 1
+                    return Response(request, raw.status_code, raw.headers, raw.content, raw.encoding)
+                error = f"HTTP {raw.status_code}"
+            except requests.RequestException as e:
+                if isinstance(e, requests.HTTPError):
+                    print(f"Giving up on {request.url}: {e}")
+                    self.stats["failed"] += 1
+                    return None
+                error = str(e)
+
+            if request.retries >= self.max_retries:
+                print(f"Giving up on {request.url} after {request.retries} retries: {error}")
+                self.stats["failed"] += 1
+                return None
+            request.retries += 1
+            self.stats["retries"] += 1
+            await asyncio.sleep(self.backoff * 2 ** (request.retries - 1) * (1 + random.random()))
+
+    # Items are taken off pending before they are saved so workers can keep adding to it in the
+    # meantime. A batch whose save fails goes back on pending to be retried with the next flush;
+    # whatever the last flush couldn't save is counted as unsaved.
+    async def flush(self, spider):
+        items = self.pending[spider]
+        if not items:
+            return
+        self.pending[spider] = []
+        try:
+            await asyncio.to_thread(spider.save_to_db, self.database, items)
+        except Exception as e:
+            print(f"{type(spider).__name__} failed to save {len(items)} items: {e}")
+            self.stats["save_failures"] += 1
+            self.pending[spider] = items + self.pending[spider]
+            return
+        self.stats["saved"] += len(items)
@@ -0,0 +1,108 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import mongomock
+
+from backend.scraping.club_spider import ClubsSpider
+from backend.scraping.crawl_fixtures import FixtureServer, EngageDirectory
+from backend.scraping.spider import CrawlEngine
+
+LISTING = "/api/discovery/search/organizations"
+DETAIL = "/api/discovery/organization/"
+
+# Crawls a 450 club EngageDirectory served by FixtureServer into mongomock
+class ClubsSpiderTest(unittest.TestCase):
+    def setUp(self):
+        self.state_dir = tempfile.mkdtemp()
+        self.database = mongomock.MongoClient().campusview
+        self.directory = EngageDirectory(450)
+
+    def tearDown(self):
+        shutil.rmtree(self.state_dir)
+
+    def crawl(self, fixture, database="default"):
+        spider = ClubsSpider(base_url=fixture.base_url, state_file=os.path.join(self.state_dir, "state.json"))
+        fixture.requests.clear()
+        stats = CrawlEngine([spider], database=self.database if database == "default" else database, concurrency=16).run()
+        return spider, stats
+
+    def cache_version(self):
+        document = self.database.cache_versions.find_one({"_id": "clubs"})
+        return document["version"] if document else 0
+
+    def test_first_crawl_upserts_every_club(self):
+        with FixtureServer(self.directory.routes()) as fixture:
+            spider, stats = self.crawl(fixture)
+
+        self.assertEqual(len(fixture.requests_to(LISTING)), 5)
+        self.assertEqual(len(fixture.requests_to(DETAIL)), 450)
+        self.assertEqual(spider.stats["upserted"], 450)
+        self.assertEqual(stats["saved"], 450)
+        self.assertEqual(self.database.clubs.count_documents({}), 450)
+        self.assertEqual(self.cache_version(), 5)
+
+        club = self.database.clubs.find_one({"name": "Club 007"}, {"_id": 0})
+        self.assertEqual(club, {
+            "name": "Club 007",
+            "image": ClubsSpider.IMAGE_URL.format("club7.png"),
+            "location": "7 Jefferson Way, Corvallis, OR",
+            "link": f"{fixture.base_url}/organization/club-7",
+            "description": "All about club 7 & its members",
+            "college": "Oregon State University",
+            "search_name": "club 007",
+            "admins": [],
+            "schedule": {"days": []},
+            "reviews": {"score": 0, "count": 0, "total": 0, "hidden": False}
+        })
+
+    def test_recrawl_of_unchanged_directory_only_revalidates_listing_pages(self):
+        with FixtureServer(self.directory.routes()) as fixture:
+            self.crawl(fixture)
+            spider, _ = self.crawl(fixture)
+
+        self.assertEqual(len(fixture.requests_to(LISTING)), 5)
+        self.assertEqual(fixture.requests_to(DETAIL), [])
+        self.assertEqual(spider.stats["pages_not_modified"], 5)
+        self.assertEqual((spider.stats["upserted"], spider.stats["modified"]), (0, 0))
+        self.assertEqual(self.cache_version(), 5)
+
+    def test_only_changed_clubs_are_fetched_and_written(self):
+        with FixtureServer(self.directory.routes()) as fixture:
+            self.crawl(fixture)
+            self.directory.organizations[7]["ProfilePicture"] = "new.png"
+            self.directory.organizations[250]["Summary"] = "Now meeting weekly"
+            spider, _ = self.crawl(fixture)
+
+        self.assertEqual(sorted(fixture.requests_to(DETAIL)), [f"{DETAIL}1007", f"{DETAIL}1250"])
+        self.assertEqual(spider.stats["pages_not_modified"], 3)
+        self.assertEqual(spider.stats["clubs_changed"], 2)
+        # Only the picture is stored, the summary is fingerprinted but not written
+        self.assertEqual((spider.stats["upserted"], spider.stats["modified"]), (0, 1))
+        self.assertEqual(self.database.clubs.find_one({"name": "Club 007"})["image"], ClubsSpider.IMAGE_URL.format("new.png"))
+        self.assertEqual(self.cache_version(), 6)
+
+    def test_club_whose_detail_failed_is_retried_next_crawl(self):
+        with FixtureServer(self.directory.routes()) as fixture:
+            fixture.failures[f"{DETAIL}1003"] = [404]
+            first, _ = self.crawl(fixture)
+            second, _ = self.crawl(fixture)
+
+        self.assertEqual(first.stats["upserted"], 449)
+        # The first listing page kept no validator, so it is read in full and only the
+        # missing club is fetched
+        self.assertEqual(second.stats["pages_not_modified"], 4)
+        self.assertEqual(fixture.requests_to(DETAIL), [f"{DETAIL}1003"])
+        self.assertEqual(second.stats["upserted"], 1)
+        self.assertEqual(self.database.clubs.count_documents({}), 450)
+
+    def test_dry_run_saves_nothing_for_the_next_crawl_to_skip(self):
+        with FixtureServer(self.directory.routes()) as fixture:
+            self.crawl(fixture, database=None)
+            spider, _ = self.crawl(fixture)
+
+        self.assertEqual(spider.stats["upserted"], 450)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import time
+import unittest
+
+from spider import Spider, Request, CrawlEngine
+from crawl_fixtures import FixtureServer
+
+# Requests its urls and yields items_per_page items for every page it parses. Saves are
+# recorded batch by batch, and the first fail_saves of them raise.
+class ListSpider(Spider):
+    def __init__(self, url, requests, items_per_page=0, fail_saves=0):
+        super().__init__(url)
+        self.requests = requests
+        self.items_per_page = items_per_page
+        self.fail_saves = fail_saves
+        self.parsed = []
+        self.batches = []
+
+    def start_requests(self):
+        return self.requests
+
+    def parse(self, response):
+        self.parsed.append(response.url)
+        for i in range(self.items_per_page):
+            yield (response.url, i)
+
+    def save_to_db(self, database, items):
+        if self.fail_saves:
+            self.fail_saves -= 1
+            raise RuntimeError("database unavailable")
+        self.batches.append(list(items))
+
+def pages(count):
+    return {f"/page/{i}": (lambda query, i=i: f"<p>page {i}</p>") for i in range(count)}
+
+# Runs CrawlEngine against FixtureServer
+class CrawlEngineTest(unittest.TestCase):
+    def crawl(self, spider, **kwargs):
+        kwargs.setdefault("backoff", 0.01)
+        engine = CrawlEngine([spider], **kwargs)
+        return engine.run()
+
+    def test_failed_requests_are_retried_with_backoff(self):
+        with FixtureServer(pages(1)) as fixture:
+            fixture.failures["/page/0"] = [503, 500]
+            spider = ListSpider(fixture.base_url, [f"{fixture.base_url}/page/0"])
+            start = time.perf_counter()
+            stats = self.crawl(spider, backoff=0.05)
+            elapsed = time.perf_counter() - start
+
+        self.assertEqual(spider.parsed, [f"{fixture.base_url}/page/0"])
+        self.assertEqual((stats["requests"], stats["retries"], stats["failed"]), (3, 2, 0))
+        # Waits of at least 0.05 s then 0.1 s before the two retries
+        self.assertGreaterEqual(elapsed, 0.15)
+
+    def test_gives_up_after_max_retries(self):
+        with FixtureServer(pages(2)) as fixture:
+            fixture.failures["/page/0"] = [503] * 5
+            spider = ListSpider(fixture.base_url, [f"{fixture.base_url}/page/0", f"{fixture.base_url}/page/1"])
+            stats = self.crawl(spider, max_retries=2)
+
+        self.assertEqual(spider.parsed, [f"{fixture.base_url}/page/1"])
+        self.assertEqual(fixture.requests_to("/page/0"), ["/page/0"] * 3)
+        self.assertEqual((stats["retries"], stats["failed"]), (2, 1))
+
+    def test_client_errors_are_not_retried(self):
+        with FixtureServer(pages(1)) as fixture:
+            spider = ListSpider(fixture.base_url, [f"{fixture.base_url}/missing"])
+            stats = self.crawl(spider)
+
+        self.assertEqual(spider.parsed, [])
+        self.assertEqual((stats["requests"], stats["retries"], stats["failed"]), (1, 0, 1))
+
+    def test_urls_already_requested_are_skipped(self):
+        with FixtureServer(pages(2)) as fixture:
+            url = f"{fixture.base_url}/page/0"
+            spider = ListSpider(fixture.base_url, [url, url, f"{url}#reviews", Request(url, dont_filter=True), f"{fixture.base_url}/page/1"])
+            stats = self.crawl(spider)
+
+        self.assertEqual(fixture.requests_to("/page/0"), ["/page/0"] * 2)
+        self.assertEqual(len(fixture.requests_to("/page/1")), 1)
+        self.assertEqual(stats["duplicates"], 2)
+
+    def test_items_are_saved_in_batches(self):
+        with FixtureServer(pages(5)) as fixture:
+            spider = ListSpider(fixture.base_url, [f"{fixture.base_url}/page/{i}" for i in range(5)], items_per_page=5)
+            stats = self.crawl(spider, batch_size=10)
+
+        self.assertEqual(sorted(len(batch) for batch in spider.batches), [5, 10, 10])
+        self.assertEqual(len({item for batch in spider.batches for item in batch}), 25)
+        self.assertEqual((stats["items"], stats["saved"], stats["unsaved"]), (25, 25, 0))
+
+    def test_a_failed_save_is_retried_with_the_next_batch(self):
+        with FixtureServer(pages(3)) as fixture:
+            spider = ListSpider(fixture.base_url, [f"{fixture.base_url}/page/{i}" for i in range(3)], items_per_page=4, fail_saves=1)
+            stats = self.crawl(spider, batch_size=4, concurrency=1)
+
+        self.assertEqual(len({item for batch in spider.batches for item in batch}), 12)
+        self.assertEqual((stats["saved"], stats["save_failures"], stats["unsaved"]), (12, 1, 0))
+
+    def test_items_that_never_save_are_counted(self):
+        with FixtureServer(pages(2)) as fixture:
+            spider = ListSpider(fixture.base_url, [f"{fixture.base_url}/page/{i}" for i in range(2)], items_per_page=3, fail_saves=100)
+            stats = self.crawl(spider, batch_size=100)
+
+        self.assertEqual(spider.batches, [])
+        self.assertEqual((stats["items"], stats["saved"], stats["unsaved"]), (6, 0, 6))
+
+if __name__ == "__main__":
+    unittest.main()
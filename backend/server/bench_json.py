@@ -0,0 +1,60 @@
+import json
+import sys
+import time
+from datetime import datetime, timezone
+from bson import json_util, ObjectId
+import serialization
+
+# Times encoding restaurant documents the way read routes used to (json_util round trip, then
+# the stdlib re-encoding it for JSONResponse) against the single encode_json pass, with and
+# without orjson.
+#   python bench_json.py [restaurants.json] [copies] [repeat]
+
+def load_documents(path: str, copies: int) -> list[dict]:
+    with open(path) as f:
+        restaurants = json.load(f)
+
+    # Shaped like what PyMongo returns, with an ObjectId and a datetime on every document
+    return [
+        dict(restaurant, _id=ObjectId(), updated=datetime.now(timezone.utc), name=f"{restaurant['name']} {i}")
+        for i in range(copies) for restaurant in restaurants
+    ]
+
+def old_path(documents):
+    return json.dumps(json.loads(json_util.dumps(documents)), ensure_ascii=False, separators=(",", ":")).encode()
+
+def stdlib_path(documents):
+    orjson = serialization.orjson
+    serialization.orjson = None
+    try:
+        return serialization.encode_json(documents)
+    finally:
+        serialization.orjson = orjson
+
+def timed(encode, documents, repeat: int) -> tuple[float, int]:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = encode(documents)
+        best = min(best, time.perf_counter() - start)
+    return best, len(body)
+
+def bench(path: str, copies: int, repeat: int):
+    documents = load_documents(path, copies)
+    print(f"{len(documents)} documents")
+
+    paths = [("json_util round trip", old_path), ("encode_json, stdlib", stdlib_path)]
+    if serialization.orjson is not None:
+        paths.append(("encode_json, orjson", serialization.encode_json))
+
+    baseline = None
+    for name, encode in paths:
+        seconds, size = timed(encode, documents, repeat)
+        baseline = baseline or seconds
+        print(f"{name:22} {seconds * 1000:8.1f} ms  {size / 1024:8.0f} KB  {baseline / seconds:5.1f}x")
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "../scraping/restaurants.json"
+    copies = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    bench(path, copies, repeat)
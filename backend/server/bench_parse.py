@@ -0,0 +1,91 @@
+import os
+import sys
+import glob
+import tempfile
+import time
+from diningWeeklyScraper import DiningScraper, HOURS_ONLY
+from scrape_fixtures import write_pages
+
+# Times how long the dining scraper spends parsing saved pages with each parser backend,
+# with and without restricting the tree to the parts it reads.
+#   python bench_parse.py                           time parsing generated fixture pages
+#   python bench_parse.py fixtures <pages_dir>      write the fixture pages into pages_dir
+#   python bench_parse.py save <pages_dir>          download the current pages into pages_dir
+#   python bench_parse.py <pages_dir> [repeat]      time parsing the saved pages
+# The fixture pages are 12 restaurants' worth of scrape_fixtures pages, each padded with 800
+# navigation links the way the real pages are, so runs are reproducible offline.
+
+def save_pages(directory: str):
+    os.makedirs(directory, exist_ok=True)
+    scraper = DiningScraper(cache_dir=None)
+
+    def save(name, url):
+        with open(os.path.join(directory, name), "wb") as f:
+            f.write(scraper.fetch(url).content)
+
+    save("locations.html", f"{scraper.base_url}/api/dining/weeklymenu/1")
+    save("hours.html", f"{scraper.base_url}/api/drupal/hours")
+    for i, rest in enumerate(scraper.scrape()):
+        save(f"detail_{i}.html", rest['detail_url'])
+        save(f"menu_{i}.html", rest['menu_url'])
+
+def read_pages(directory: str, pattern: str) -> list[bytes]:
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, pattern))):
+        with open(path, "rb") as f:
+            pages.append(f.read())
+    return pages
+
+def parse_hours(scraper: DiningScraper, html: bytes):
+    page = scraper.soup(html, HOURS_ONLY).find('div', class_='pure-g')
+    return [group.find_all('div', recursive=False) for group in page.find_all('div', class_='pure-g')]
+
+def bench(directory: str, repeat: int):
+    pages = {
+        "hours": read_pages(directory, "hours.html"),
+        "locations": read_pages(directory, "locations.html"),
+        "detail": read_pages(directory, "detail_*.html"),
+        "menu": read_pages(directory, "menu_*.html")
+    }
+    print(", ".join(f"{len(html)} {kind}" for kind, html in pages.items()) + f" pages, best of {repeat}")
+
+    for parser in ("html.parser", "lxml"):
+        for strain in (False, True):
+            try:
+                scraper = DiningScraper(cache_dir=None, parser=parser, strain=strain)
+                scraper.soup("<p></p>")
+            except Exception as e:
+                print(f"{parser}: unavailable ({e})")
+                break
+
+            parsers = {
+                "hours": lambda html: parse_hours(scraper, html),
+                "locations": scraper.parseRestIDMap,
+                "detail": scraper.parseDetail,
+                "menu": scraper.parseMenu
+            }
+            timings = {}
+            for kind, kind_pages in pages.items():
+                best = float("inf")
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    for html in kind_pages:
+                        parsers[kind](html)
+                    best = min(best, time.perf_counter() - start)
+                timings[kind] = best
+
+            total = sum(timings.values())
+            detail = ", ".join(f"{kind} {seconds * 1000:.1f}" for kind, seconds in timings.items())
+            print(f"{parser:<12} strain={str(strain):<5} total {total * 1000:8.1f} ms ({detail})")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "save":
+        save_pages(sys.argv[2])
+    elif len(sys.argv) > 2 and sys.argv[1] == "fixtures":
+        write_pages(sys.argv[2])
+    elif len(sys.argv) > 1:
+        bench(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 5)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            write_pages(directory)
+            bench(directory, 5)
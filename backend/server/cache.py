@@ -0,0 +1,70 @@
+import time
+import threading
+from collections import OrderedDict
+
+# Thread-safe LRU cache whose entries expire ttl seconds after they are set.
+# Shared by route handlers running in the threadpool, so every access takes the lock.
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = (time.monotonic() + self.ttl, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+# Rendered GET responses, keyed by collection, route and query. Each collection has a version
+# number that is part of every key, so a write invalidates all cached responses built from that
+# collection by bumping it; the stale entries are never looked up again and age out of the LRU.
+# Versions live in this process by default. Given a MongoDB collection they are read from and
+# bumped there instead, so every worker process sees every invalidation.
+class ResponseCache:
+    def __init__(self, maxsize: int, ttl: float, shared_versions=None):
+        self.entries = TTLCache(maxsize, ttl)
+        self.shared_versions = shared_versions
+        self.versions = {}
+        self.lock = threading.Lock()
+
+    def version(self, name: str) -> int:
+        if self.shared_versions is not None:
+            document = self.shared_versions.find_one({"_id": name})
+            return document["version"] if document else 0
+        return self.versions.get(name, 0)
+
+    def invalidate(self, name: str):
+        if self.shared_versions is not None:
+            self.shared_versions.update_one({"_id": name}, {"$inc": {"version": 1}}, upsert=True)
+            return
+        with self.lock:
+            self.versions[name] = self.versions.get(name, 0) + 1
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, value):
+        self.entries.set(key, value)
@@ -0,0 +1,43 @@
+import gzip
+from typing import Optional
+
+# brotli compresses JSON noticeably smaller than gzip but is optional
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Encodings in the order they are preferred when a client accepts several
+ENCODINGS = ["br", "gzip"] if brotli is not None else ["gzip"]
+
+# Compressed copies of body in every supported encoding, or none if it's too small to be worth it.
+# Made once when a response is cached, so every request after that is served without compressing.
+def compress_variants(body: bytes, min_size: int) -> dict:
+    if len(body) < min_size:
+        return {}
+    variants = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(body, mode=brotli.MODE_TEXT, quality=9)
+    return variants
+
+# Picks the preferred encoding the client accepts out of the ones available, honouring q=0
+def choose_encoding(accept_encoding: str, available) -> Optional[str]:
+    if not accept_encoding or not available:
+        return None
+
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0
+        accepted[name.strip().lower()] = quality
+
+    for encoding in ENCODINGS:
+        if encoding in available and accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
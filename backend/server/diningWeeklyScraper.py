@@ -1,20 +1,146 @@
 import requests
+from requests.adapters import HTTPAdapter
 import bs4 as bs
 import re
 import datetime
+import time
+import os
+import hashlib
+import threading
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
 from collections import defaultdict
 import json
+from importlib.util import find_spec
+
+# lxml is several times faster than the stdlib parser but optional
+DEFAULT_PARSER = 'lxml' if find_spec('lxml') is not None else 'html.parser'
+
+# Only the parts of each page the scraper reads are built into a tree
+HOURS_ONLY = bs.SoupStrainer('div', attrs={'class': 'pure-g'})
+LOCATIONS_ONLY = bs.SoupStrainer('select', attrs={'id': 'locations'})
+CONTENT_ONLY = bs.SoupStrainer('div', attrs={'id': 'content'})
+SECTIONS_ONLY = bs.SoupStrainer('div', attrs={'class': 'section'})
+
+# Spaces out requests to the same host so the concurrent scrape doesn't hammer one server
+class HostRateLimiter:
+    def __init__(self, requests_per_second: float):
+        self.interval = 1 / requests_per_second if requests_per_second > 0 else 0
+        self.next_slot = {}
+        self.lock = threading.Lock()
+
+    def wait(self, url: str):
+        host = urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+# On-disk store of each page's validators (ETag / Last-Modified), a hash of its body and
+# what was parsed out of it, one JSON file per URL
+class ResponseCache:
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, url: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(url.encode()).hexdigest() + ".json")
+
+    def load(self, url: str):
+        try:
+            with open(self.path(url)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, url: str, entry: dict):
+        # Write then rename so concurrent workers never see a partial file
+        path = self.path(url)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp, path)
 
 class DiningScraper:
-    def __init__(self):
-        self.rest_id_map = self.getRestIDMap()
+    def __init__(self, max_workers=8, requests_per_second=10, base_url="https://my.uhds.oregonstate.edu", cache_dir=".scrape_cache", parser=DEFAULT_PARSER, strain=True):
+        self.base_url = base_url
+        self.parser = parser
+        self.strain = strain
+        self.max_workers = max_workers
+        self.rate_limiter = HostRateLimiter(requests_per_second)
+        self.cache = ResponseCache(cache_dir) if cache_dir else None
+
+        # Pages fetched, answered 304, unchanged by content hash, and actually parsed
+        self.stats = {"fetched": 0, "not_modified": 0, "unchanged": 0, "parsed": 0}
+        self.stats_lock = threading.Lock()
+
+        # One pooled session so every page reuses keep-alive connections
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # Fetched on the first scrape rather than here, so constructing a scraper is free
+        self.rest_id_map = None
         self.rest_list = None
 
+    # Parses html with the configured backend, restricted to what `only` matches when straining
+    def soup(self, html, only=None):
+        return bs.BeautifulSoup(html, self.parser, parse_only=only if self.strain else None)
+
+    def fetch(self, url, headers=None):
+        self.rate_limiter.wait(url)
+        response = self.session.get(url, headers=headers, timeout=30)
+        response.raise_for_status()
+        return response
+
+    def count(self, stat):
+        with self.stats_lock:
+            self.stats[stat] += 1
+
+    # Fetches a page and returns parse(body), reusing the cached result when the server
+    # answers 304 to the stored validators or the body hashes the same as last time
+    def fetchParsed(self, url, parse):
+        entry = self.cache.load(url) if self.cache else None
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = self.fetch(url, headers)
+        self.count("fetched")
+        if entry and response.status_code == 304:
+            self.count("not_modified")
+            return entry["parsed"]
+
+        content_hash = hashlib.sha256(response.content).hexdigest()
+        if entry and entry.get("content_hash") == content_hash:
+            self.count("unchanged")
+            parsed = entry["parsed"]
+        else:
+            self.count("parsed")
+            parsed = parse(response.content)
+
+        if self.cache:
+            self.cache.save(url, {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "content_hash": content_hash,
+                "parsed": parsed
+            })
+        return parsed
+
     def getRestIDMap(self):
+        url = f"{self.base_url}/api/dining/weeklymenu/1"
+        return self.fetchParsed(url, self.parseRestIDMap)
+
+    def parseRestIDMap(self, html):
         menus = {}
-        url = "https://my.uhds.oregonstate.edu/api/dining/weeklymenu/1"
-        response = requests.get(url)
-        soup = bs.BeautifulSoup(response.text, 'html.parser')
+        soup = self.soup(html, LOCATIONS_ONLY)
         locations = soup.find('select', id='locations')
         options = locations.find_all('option')
         for option in options:
@@ -27,102 +153,140 @@ class DiningScraper:
         menus['The MainSqueeze'] = menus.pop('The Main Squeeze')
         menus["Bing's at Weatherford"] = menus.pop("Bing's Cafe")
         return menus
-    
-    def scrape(self):
-        rest_id_map = self.rest_id_map
-        soup = bs.BeautifulSoup(requests.get('https://my.uhds.oregonstate.edu/api/drupal/hours').text, 'html.parser')
+
+    # progress, if given, is called with (restaurants done, restaurants total) as pages complete
+    def scrape(self, progress=None):
+        if self.rest_id_map is None:
+            self.rest_id_map = self.getRestIDMap()
+
+        soup = self.soup(self.fetch(f'{self.base_url}/api/drupal/hours').text, HOURS_ONLY)
         page = soup.find('div', class_='pure-g')
         buildings = page.find_all('h1', class_='zone')
         groups = page.find_all('div', class_='pure-g')
 
-        rest_list = []
+        # print today's date in number format November 27th
+        today = datetime.datetime.now()
 
+        entries = []
         for building, group in zip(buildings, groups):
             for restaurant in group.findChildren('div', recursive=False):
                 if '*' in restaurant.a.text:
                     continue
-                rest = {}
+                entries.append((building.text.strip(), restaurant))
 
-                rest['detail_url'] = restaurant.a.get('href')
-                rest['dining_hall'] = building.text.strip()
+        done = 0
+        def scrapeEntry(entry):
+            nonlocal done
+            rest = self.scrapeRestaurant(*entry, today)
+            with self.stats_lock:
+                done += 1
+                finished = done
+            if progress:
+                progress(finished, len(entries))
+            return rest
 
-                detail_url = restaurant.a.get('href')
-                rest_soup = bs.BeautifulSoup(requests.get(detail_url).content, 'html.parser')
-                content = rest_soup.find('div', id='content')
-                img = content.find('img')
-                img_url = ""
-                if img:
-                    img_url = "https://uhds.oregonstate.edu" + img.get('src')
-                rest['img_url'] = img_url
-                info = content.find('iframe').parent.parent
+        # Detail and menu pages of different restaurants are fetched in parallel, bounded
+        # by max_workers; map keeps the order of the hours page
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = executor.map(scrapeEntry, entries)
+            rest_list = [rest for rest in results if rest is not None]
 
-                name = info.findChildren()[0].text.strip() or info.findChildren()[1].text.strip()
-                name = name.replace('é', 'e')
-                name = name.replace('\xa0', ' ')
+        self.rest_list = rest_list
+        return rest_list
 
-                rest_id = rest_id_map[name]
+    def scrapeRestaurant(self, dining_hall, restaurant, today):
+        rest_id_map = self.rest_id_map
+        rest = {}
 
-                rest['name'] = name
-                
-                desc = info.find('p').text.strip()
+        rest['detail_url'] = restaurant.a.get('href')
+        rest['dining_hall'] = dining_hall
 
-                rest['description'] = desc
+        detail_url = restaurant.a.get('href')
+        rest.update(self.fetchParsed(detail_url, self.parseDetail))
+        name = rest['name']
 
-                rest_id = rest_id_map[name]
-                rest['id'] = rest_id
+        rest_id = rest_id_map[name]
+        rest['id'] = rest_id
 
-                menu_url = f'https://my.uhds.oregonstate.edu/api/dining/weeklymenu/{rest_id}/true'
-                rest['menu_url'] = menu_url
+        menu_url = f'{self.base_url}/api/dining/weeklymenu/{rest_id}/true'
+        rest['menu_url'] = menu_url
 
-                # find p tag with text 'Location'
-                location_tag = rest_soup.find('p', string=re.compile('Location'))
-                address = location_tag.find_next_sibling('p').text.strip().replace('\n', ', ').replace('\t', '')
-                if address == "":
-                    address = location_tag.find_next_sibling('p').find_next_sibling('p').text.strip().replace('\n', ', ').replace('\t', '')
-                rest['address'] = address
+        time_divs = restaurant.find_all('div', class_='time')
 
-                time_divs = restaurant.find_all('div', class_='time')
+        day = today
+        times = {}
+        times[day.strftime("%B %d")] = []
+        for time_div in time_divs: times[day.strftime("%B %d")].append(time_div.text.strip())
 
-                # print today's date in number format November 27th
-                today = datetime.datetime.now()
+        more_hours = restaurant.find('div', class_='more_hours')
+        delta_day = datetime.timedelta(days=1)
 
-                times = {}
-                times[today.strftime("%B %d")] = []
-                for time_div in time_divs: times[today.strftime("%B %d")].append(time_div.text.strip())
+        for element in more_hours.children:
+            if element.name == 'strong':
+                day += delta_day
+                times[day.strftime("%B %d")] = []
+            elif element.name == 'em':
+                times[day.strftime("%B %d")].append(element.text)
 
-                more_hours = restaurant.find('div', class_='more_hours')
-                delta_day = datetime.timedelta(days=1)
+        rest['schedule'] = times
 
-                for element in more_hours.children:
-                    if element.name == 'strong':
-                        today += delta_day
-                        times[today.strftime("%B %d")] = []
-                    elif element.name == 'em':
-                        times[today.strftime("%B %d")].append(element.text)
+        rest['menu'] = self.fetchParsed(menu_url, self.parseMenu)
+        if rest['menu'] == {}:
+            return None
 
-                rest['schedule'] = times
-                
-                weekly_menu = defaultdict(list)
-                menus = bs.BeautifulSoup(requests.get(rest['menu_url']).content, 'html.parser')
-                sections = menus.find_all('div', class_='section')
+        return rest
+
+    # Image, name, description and address from a restaurant's detail page
+    def parseDetail(self, html):
+        detail = {}
+        rest_soup = self.soup(html, CONTENT_ONLY)
+        content = rest_soup.find('div', id='content')
+        img = content.find('img')
+        img_url = ""
+        if img:
+            img_url = "https://uhds.oregonstate.edu" + img.get('src')
+        detail['img_url'] = img_url
+        info = content.find('iframe').parent.parent
+
+        name = info.findChildren()[0].text.strip() or info.findChildren()[1].text.strip()
+        name = name.replace('é', 'e')
+        name = name.replace('\xa0', ' ')
+
+        detail['name'] = name
+
+        desc = info.find('p').text.strip()
+
+        detail['description'] = desc
+
+        # find p tag with text 'Location'
+        location_tag = rest_soup.find('p', string=re.compile('Location'))
+        if location_tag is None and self.strain:
+            # Not inside div#content on this page, fall back to the whole document
+            location_tag = bs.BeautifulSoup(html, self.parser).find('p', string=re.compile('Location'))
+        address = location_tag.find_next_sibling('p').text.strip().replace('\n', ', ').replace('\t', '')
+        if address == "":
+            address = location_tag.find_next_sibling('p').find_next_sibling('p').text.strip().replace('\n', ', ').replace('\t', '')
+        detail['address'] = address
+        return detail
+
+    # Menu sections from a restaurant's weekly menu page, keyed by date
+    def parseMenu(self, html):
+        weekly_menu = defaultdict(list)
+        menus = self.soup(html, SECTIONS_ONLY)
+        sections = menus.find_all('div', class_='section')
+
+        for section in sections:
+            title = section.find('h6').text.strip()
+            date = title.split('-')[-1].replace("th", "").replace("nd", "").replace("rd", "").replace("st", "").strip()
+            ingredients = [p.text.strip() for p in section.find_all('p')]
+            weekly_menu[date].append({'title': title, 'items': ingredients})
+
+        return dict(weekly_menu)
 
-                if sections == []:
-                    rest['menu'] = {}
-                    continue
-                
-                for section in sections:
-                    title = section.find('h6').text.strip()
-                    date = title.split('-')[-1].replace("th", "").replace("nd", "").replace("rd", "").replace("st", "").strip()
-                    ingredients = [p.text.strip() for p in section.find_all('p')]
-                    weekly_menu[date].append({'title': title, 'items': ingredients})
-
-                rest['menu'] = weekly_menu
-                rest_list.append(rest)
-                self.rest_list = rest_list
-        return rest_list
-            
 if __name__ == '__main__':
     scraper = DiningScraper()
+    start = time.perf_counter()
     rest_list = scraper.scrape()
-    print(len(rest_list))
-    print(rest_list)
\ No newline at end of file
+    print(f"scraped {len(rest_list)} restaurants in {time.perf_counter() - start:.1f}s")
+    print(scraper.stats)
+    print(rest_list)
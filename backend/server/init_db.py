@@ -1,14 +1,19 @@
-from pymongo import MongoClient
-from pymongo.collection import Collection
-import shelve
-from shelve import Shelf
+from pymongo import MongoClient, UpdateOne, ASCENDING
+from pymongo.errors import BulkWriteError
 import json
+import sys
+import time
 from datetime import datetime
 from pydantic import BaseModel
 from typing import Optional, List
-from fastapi import HTTPException
 from dotenv import dotenv_values
 
+# ijson parses incrementally in C when installed, otherwise the stdlib decoder is fed chunks
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
 config = dotenv_values(".env")
 client = MongoClient(config['MONGODB_CONNECTSTR'])
 
@@ -30,16 +35,6 @@ class Restaurant(BaseModel):
     schedule: Optional[dict[str, Schedule]] = None
     menu: Optional[List[MenuItem]] = None
 
-def insert_new_item(collection: Collection, map: Shelf, name: str, item: BaseModel):
-    if name in map:
-        raise HTTPException(status_code=409, detail="Item already exists")
-
-    new_id = collection.insert_one(item.model_dump()).inserted_id
-    map[name] = new_id
-    map.sync()
-    
-    return {"message": "Success"}
-
 def transform_menu_data(menu_data):
     """Transform the menu data into the required format."""
     if not menu_data:
@@ -63,57 +58,143 @@ def transform_hours(times_data):
     
     return schedule
 
-def load_restaurants(data_file, restaurant_collection, restaurant_map):
-    """Load restaurants directly into MongoDB using insert_new_item."""
-    # Read the JSON file
-    with open(data_file, 'r') as f:
-        restaurants = json.load(f)
-    
+# Yields the elements of a top-level JSON array one at a time, reading the file in chunks
+# so memory stays flat however large the dataset is
+def iter_json_array(f, chunk_size=1 << 16):
+    if ijson is not None:
+        yield from ijson.items(f, "item")
+        return
+
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+    started = False
+
+    while True:
+        # Skip whitespace, the opening bracket and separators between elements
+        while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] == "," or (buffer[pos] == "[" and not started)):
+            started = started or buffer[pos] == "["
+            pos += 1
+
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+
+        if pos < len(buffer):
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                # A number cut off at the end of the buffer would decode short, so the
+                # element only counts once something that can follow it has been read
+                if eof or (end < len(buffer) and (buffer[end].isspace() or buffer[end] in ",]")):
+                    yield item
+                    pos = end
+                    continue
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+
+        if eof:
+            return
+
+        # The next element is incomplete, drop what has been consumed and read more
+        buffer = buffer[pos:]
+        pos = 0
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer += chunk
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def transform_restaurant(restaurant, today):
+    # Transform the data - the trickiest part IMO
+    return Restaurant(
+        name=restaurant["name"],
+        image=restaurant["img_url"],
+        building=restaurant["dining_hall"],
+        location=restaurant["address"],
+        dining_hall=restaurant["dining_hall"],
+        description=restaurant["description"],
+        schedule=transform_hours(restaurant.get("times")),
+        menu=transform_menu_data(restaurant.get("menu", {}).get(today))
+    )
+
+def write_batch(restaurant_collection, documents, upsert):
+    """Write one validated batch, returning how many documents were written."""
+    if upsert:
+        # Overwrites existing restaurants with this file's shape. The server's menu index
+        # postings for them are dropped, and the server's cached responses are invalidated
+        # when it runs with RESPONSE_CACHE_SHARED (otherwise they expire on their own).
+        operations = [UpdateOne({"name": document["name"]}, {"$set": document}, upsert=True) for document in documents]
+        result = restaurant_collection.bulk_write(operations, ordered=False)
+        database = restaurant_collection.database
+        database.menu_index.delete_many({"restaurant": {"$in": [document["name"] for document in documents]}})
+        database.cache_versions.update_one({"_id": restaurant_collection.name}, {"$inc": {"version": 1}}, upsert=True)
+        return result.upserted_count + result.matched_count
+
+    # The default: plain inserts, restaurants that already exist are skipped
+    try:
+        return len(restaurant_collection.insert_many(documents, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        for error in e.details["writeErrors"]:
+            print(f"Error loading {documents[error['index']]['name']}: {error['errmsg']}")
+        return e.details["nInserted"]
+
+# Inserts rely on the unique index on name to skip restaurants that already exist. It's the
+# index the server makes at startup, made here as well since the database may be seeded first.
+def ensure_name_index(restaurant_collection):
+    restaurant_collection.create_index([("name", ASCENDING)], unique=True, partialFilterExpression={"name": {"$exists": True}})
+
+def load_restaurants(data_file, restaurant_collection, batch_size=500, upsert=False):
+    """Stream restaurants from data_file into MongoDB, validating and writing batch_size at a time."""
+    ensure_name_index(restaurant_collection)
     success_count = 0
     failure_count = 0
-    
-    for restaurant in restaurants:
-        try:
-            # Transform the data - the trickiest part IMO
-            transformed_data = Restaurant(
-                name=restaurant["name"],
-                image=restaurant["img_url"],
-                building=restaurant["dining_hall"],
-                location=restaurant["address"],
-                dining_hall=restaurant["dining_hall"],
-                description=restaurant["description"],
-                schedule=transform_hours(restaurant.get("times")),
-                menu=transform_menu_data(restaurant.get("menu", {}).get(datetime.now().strftime("%B %d")))
-            )
-
-            print(f"Transformed data: {json.dumps(transformed_data.dict(), indent=2)}")
-            
-            try:
-                insert_new_item(restaurant_collection, restaurant_map, restaurant["name"], transformed_data)
-                print(f"Successfully loaded {restaurant['name']}")
-                success_count += 1
-            except HTTPException as http_error:
-                print(f"HTTP error loading {restaurant['name']}: {http_error.detail}")
-                failure_count += 1
-                
-        except Exception as e:
-            print(f"Error processing {restaurant['name']}: {str(e)}")
-            failure_count += 1
-    
-    return success_count, failure_count
+    today = datetime.now().strftime("%B %d")
+    start = time.perf_counter()
+
+    with open(data_file, 'r') as f:
+        for batch in batched(iter_json_array(f), batch_size):
+            documents = []
+            for restaurant in batch:
+                try:
+                    document = transform_restaurant(restaurant, today).model_dump()
+                    # The lowercased name the server's /search prefix-matches on
+                    document["search_name"] = document["name"].casefold()
+                    documents.append(document)
+                except Exception as e:
+                    print(f"Error processing {restaurant.get('name')}: {str(e)}")
+                    failure_count += 1
+
+            if documents:
+                written = write_batch(restaurant_collection, documents, upsert)
+                success_count += written
+                failure_count += len(documents) - written
+
+            elapsed = time.perf_counter() - start
+            print(f"{success_count + failure_count} records, {(success_count + failure_count) / elapsed:.0f} records/second")
+
+    return success_count, failure_count, time.perf_counter() - start
 
 if __name__ == "__main__":
+    # usage: python init_db.py [data_file] [batch_size] [insert|upsert]
+    DATA_FILE = sys.argv[1] if len(sys.argv) > 1 else "restaurants.json"
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    upsert = (sys.argv[3] if len(sys.argv) > 3 else "insert") == "upsert"
+
     # MongoDB connection
     db = client.campusview
     restaurants_collection = db.restaurants
-    restaurant_map = shelve.open("rest")
 
-    DATA_FILE = "restaurants.json"
-    
     print("Starting restaurant data load...")
-    success, failure = load_restaurants(DATA_FILE, restaurants_collection, restaurant_map)
-    print(f"\nLoad complete!")
+    success, failure, elapsed = load_restaurants(DATA_FILE, restaurants_collection, batch_size, upsert)
+    print(f"\nLoad complete in {elapsed:.2f}s ({(success + failure) / elapsed:.0f} records/second)")
     print(f"Successfully loaded: {success} restaurants")
     print(f"Failed to load: {failure} restaurants")
-
-    restaurant_map.close()
\ No newline at end of file
@@ -0,0 +1,43 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from passlib.context import CryptContext    # for password hashing
+
+pwd_context = CryptContext(schemes=['bcrypt'], deprecated="auto")
+
+# Hash password
+def get_password_hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+# Verify password against the hash password
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+# Runs bcrypt in a pool of worker processes so a burst of logins neither stalls the
+# event loop nor holds the threads serving database reads, and spreads across cores.
+# Workers are spawned rather than forked since the server process is multi-threaded.
+class PasswordHasher:
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.pending = 0    # hash jobs submitted but not finished, only touched on the event loop
+        self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+    async def _run(self, fn, *args):
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    # Jobs waiting for a free worker
+    def queue_depth(self) -> int:
+        return max(0, self.pending - self.workers)
+
+    def shutdown(self):
+        self.pool.shutdown(cancel_futures=True)
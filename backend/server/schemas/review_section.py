@@ -1,7 +1,8 @@
-from .review import Review
 from pydantic import BaseModel
 
+# Aggregate of an item's reviews, the reviews themselves live in the reviews collection
 class ReviewSection(BaseModel):
     score : float               # average of all scores in reviews
-    reviews : list[Review]
+    count : int = 0             # number of reviews, kept so score can be updated atomically
+    total : float = 0           # sum of all ratings in reviews
     hidden : bool               # might be good option
\ No newline at end of file
@@ -0,0 +1,141 @@
+import hashlib
+import os
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Synthetic copies of the UHDS dining pages the scraper reads, shaped like the real ones but
+# small and deterministic. Used by the scraper tests (served by FixtureServer) and by
+# bench_parse.py (written to disk). nav_links pads every page with the kind of site-wide
+# navigation markup the real pages carry, which the parser has to get through.
+
+def nav(nav_links: int) -> str:
+    links = "".join(f"<ul><li><a href='/x{i}'>Link {i}</a><span>text {i}</span></li></ul>" for i in range(nav_links))
+    return f"<div class='nav'>{links}</div>"
+
+def restaurant_names(count: int) -> list[str]:
+    return [f"Restaurant {i}" for i in range(count)]
+
+def hours_page(base_url: str, count: int, nav_links: int = 0) -> str:
+    restaurants = "".join(
+        f"<div><a href='{base_url}/detail/{i}'>{name}</a><div class='time'>7:00 AM - 2:00 PM</div>"
+        f"<div class='more_hours'><strong>Tomorrow</strong><em>7:00 AM - 2:00 PM</em><strong>Next</strong><em>Closed</em></div></div>"
+        for i, name in enumerate(restaurant_names(count))
+    )
+    # A starred restaurant is listed on the page but skipped by the scraper
+    restaurants += f"<div><a href='{base_url}/detail/closed'>Closed for the term*</a></div>"
+    return f"<html><body>{nav(nav_links)}<div class='pure-g'><h1 class='zone'>Hall A</h1><div class='pure-g'>{restaurants}</div></div></body></html>"
+
+# The menu dropdown that maps restaurant names to their menu ids, including the two names
+# the scraper renames
+def locations_page(count: int, nav_links: int = 0) -> str:
+    names = restaurant_names(count) + ["The Main Squeeze", "Bing's Cafe"]
+    options = "".join(f"<option value='{menu_id(i)}'>{name}</option>" for i, name in enumerate(names))
+    return f"<html><body>{nav(nav_links)}<select id='locations'>{options}</select></body></html>"
+
+def menu_id(i: int) -> int:
+    return 100 + i
+
+def detail_page(i: int, nav_links: int = 0) -> str:
+    return (f"<html><body>{nav(nav_links)}<div id='content'><img src='/img/{i}.jpg'>"
+            f"<div><div><h2>Restaurant {i}</h2><p>Description of restaurant {i}</p><div><iframe></iframe></div></div></div>"
+            f"<p>Location</p><p>{i} Campus Way\nCorvallis</p></div></body></html>")
+
+def menu_page(i: int, nav_links: int = 0, days=("November 27th", "November 28th")) -> str:
+    sections = "".join(
+        f"<div class='section'><h6>Lunch - {day}</h6><p>Dish {i}</p><p>Salad</p></div>" for day in days
+    )
+    return f"<html><body>{nav(nav_links)}{sections}</body></html>"
+
+# Every page the scraper fetches for count restaurants, keyed by path
+def fixture_pages(base_url: str, count: int, nav_links: int = 0) -> dict[str, str]:
+    pages = {
+        "/api/drupal/hours": hours_page(base_url, count, nav_links),
+        "/api/dining/weeklymenu/1": locations_page(count, nav_links)
+    }
+    for i in range(count):
+        pages[f"/detail/{i}"] = detail_page(i, nav_links)
+        pages[f"/api/dining/weeklymenu/{menu_id(i)}/true"] = menu_page(i, nav_links)
+    return pages
+
+# Writes the pages under the names bench_parse.py reads
+def write_pages(directory: str, count: int = 12, nav_links: int = 800):
+    os.makedirs(directory, exist_ok=True)
+    pages = fixture_pages("http://localhost", count, nav_links)
+    files = {"locations.html": pages["/api/dining/weeklymenu/1"], "hours.html": pages["/api/drupal/hours"]}
+    for i in range(count):
+        files[f"detail_{i}.html"] = pages[f"/detail/{i}"]
+        files[f"menu_{i}.html"] = pages[f"/api/dining/weeklymenu/{menu_id(i)}/true"]
+    for name, html in files.items():
+        with open(os.path.join(directory, name), "w") as f:
+            f.write(html)
+
+# Serves fixture_pages on localhost from a background thread. Each response is held for
+# delay seconds, and the server records when every request arrived and the most requests it
+# was handling at once. Pages carry ETags and answer 304 to a matching If-None-Match unless
+# etags is turned off.
+class FixtureServer:
+    def __init__(self, count: int = 12, delay: float = 0.0, nav_links: int = 0):
+        self.delay = delay
+        self.etags = True
+        self.arrivals = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with fixture.lock:
+                    fixture.arrivals.append((time.monotonic(), self.path))
+                    fixture.in_flight += 1
+                    fixture.max_in_flight = max(fixture.max_in_flight, fixture.in_flight)
+                try:
+                    time.sleep(fixture.delay)
+                    fixture.respond(self)
+                finally:
+                    with fixture.lock:
+                        fixture.in_flight -= 1
+
+        self.server = ThreadingHTTPServer(("localhost", 0), Handler)
+        self.base_url = f"http://localhost:{self.server.server_port}"
+        self.pages = fixture_pages(self.base_url, count, nav_links)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def respond(self, handler):
+        html = self.pages.get(handler.path)
+        if html is None:
+            handler.send_response(404)
+            handler.end_headers()
+            return
+
+        body = html.encode()
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        if self.etags and handler.headers.get("If-None-Match") == etag:
+            handler.send_response(304)
+            handler.send_header("ETag", etag)
+            handler.end_headers()
+            return
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/html; charset=utf-8")
+        handler.send_header("Content-Length", str(len(body)))
+        if self.etags:
+            handler.send_header("ETag", etag)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def requests_to(self, prefix: str) -> list[str]:
+        return [path for _, path in self.arrivals if path.startswith(prefix)]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
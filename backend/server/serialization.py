@@ -0,0 +1,24 @@
+import json
+from datetime import date, datetime
+from bson import ObjectId
+
+# orjson encodes straight to bytes several times faster than the stdlib but is optional
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Types PyMongo hands back that JSON has no encoding for
+def default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+# Encodes documents read from MongoDB to compact JSON bytes in one pass, with ObjectIds as
+# strings and datetimes in ISO 8601, so nothing is round-tripped through json_util first
+def encode_json(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, default=default)
+    return json.dumps(value, default=default, ensure_ascii=False, separators=(",", ":")).encode()
@@ -1,23 +1,36 @@
 # FastAPI imports
-from fastapi import FastAPI, Request, HTTPException, status
+from fastapi import FastAPI, Request, HTTPException, Query, status
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.concurrency import run_in_threadpool
 from diningWeeklyScraper import DiningScraper
+from login import PasswordHasher
+from cache import TTLCache, ResponseCache
+from compression import compress_variants, choose_encoding
+from serialization import encode_json
 
 # For MongoDB database access
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING, DESCENDING, UpdateOne, InsertOne, DeleteMany
 from pymongo.collection import Collection
+from pymongo.errors import DuplicateKeyError, OperationFailure
 from dotenv import dotenv_values
 
 # For handling json formatting and processing
-import json
-from bson import json_util
+import base64
+import hashlib
+from bson import json_util, ObjectId
 
-# Used for persistant map store
+# Used to read the legacy shelf map store
+import dbm
 import shelve
-from shelve import Shelf
 from contextlib import asynccontextmanager
+import os
+from anyio import to_thread
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 # Schema imports
 from pydantic import BaseModel
@@ -25,7 +38,7 @@ from typing import Optional
 from schemas.dining.restaurant import Restaurant
 from schemas.club import Club
 from schemas.study_spot import StudySpot
-from schemas.review_section import ReviewSection, Review
+from schemas.review import Review
 from schemas.user import User
 
 # Authentication imports
@@ -34,10 +47,19 @@ from jwt.exceptions import InvalidTokenError, PyJWTError
 from typing import Annotated
 from fastapi import Depends
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from passlib.context import CryptContext    # for password hashing
 from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+import re
+import unicodedata
 
 config = dotenv_values(".env")
+
+# Number of requests that may be waiting on MongoDB at once, each holds a worker thread
+DB_THREADS = int(config.get('DB_THREADS') or 40)
+# Responses smaller than this many bytes are sent uncompressed
+COMPRESS_MIN_SIZE = int(config.get('COMPRESS_MIN_SIZE') or 1024)
+# Number of bcrypt hashes computed at once, one process each
+HASH_WORKERS = int(config.get('HASH_WORKERS') or os.cpu_count() or 1)
 client = MongoClient(config['MONGODB_CONNECTSTR'])
 templates = Jinja2Templates("./templates")
 
@@ -48,43 +70,177 @@ clubs = db.clubs
 studyspots = db.studyspots
 reviews = db.reviews
 users = db.users    #DB for user login
+jobs = db.jobs      # status of background jobs such as dining refreshes
+locks = db.locks    # leases that keep a job to one run at a time across workers
+menu_index = db.menu_index  # term -> restaurant, day, section and item, derived from restaurant menus
+migrations = db.migrations  # one-off data migrations that have finished
 
-# Persistant store of mapping between endpoint name and document obj_id in MongoDB
-rest_map = shelve.open("rest")
-club_map = shelve.open("club")
-study_map = shelve.open("study")
-review_map = shelve.open("review")
-
-# Maps type of collection to the collection and shelf map
+# Maps type of collection to the collection, the field its endpoint name is stored in and its schema
 type_map = {
-    "restaurant" : (restaurants, rest_map, Restaurant),
-    "club" : (clubs, club_map, Club),
-    "studyspot" : (studyspots, study_map, StudySpot),
-    "review" : (reviews, review_map, Review)
+    "restaurant" : (restaurants, "name", Restaurant),
+    "club" : (clubs, "name", Club),
+    "studyspot" : (studyspots, "name", StudySpot),
+    "review" : (reviews, "review_id", Review)
 }
 
-# syncs shelves with database just to ensure that there are no mappings that shouldn't exist
-def sync_shelves():
-    print("syncing shelves with database")
-    for collection, map, target in [(restaurants, rest_map, "name"), (clubs, club_map, "name"), (studyspots, study_map, "name"), (reviews, review_map, "review_id")]:
-        cursor = collection.find({})
-        for document in cursor:
-            obj_id = document['_id']
-            name = str(document[target])
-            if name not in map:
-                map[name] = obj_id
+# Types that carry a review section and can be reviewed
+reviewed_types = ("restaurant", "club", "studyspot")
+
+# Shelf files that used to map endpoint names to document obj_ids, read once at startup to backfill key fields
+legacy_shelves = {
+    "restaurant" : "rest",
+    "club" : "club",
+    "studyspot" : "study",
+    "review" : "review"
+}
+
+# Fields returned by ?view=summary for each type, enough to render a list card
+summary_views = {
+    "restaurant" : ["name", "image", "dining_hall", "cuisine", "reviews.score", "reviews.count"],
+    "club" : ["name", "image", "location", "college", "reviews.score", "reviews.count"],
+    "studyspot" : ["name", "building", "location", "reviews.score", "reviews.count"],
+    "review" : ["review_id", "type", "owner", "user", "rating", "time"]
+}
+
+# Text index fields and their weights per searchable type, a name match ranks above a
+# match in the description
+search_weights = {
+    "restaurant" : {"name": 10, "cuisine": 5, "dining_hall": 3, "building": 3, "description": 1},
+    "club" : {"name": 10, "college": 3, "description": 1},
+    "studyspot" : {"name": 10, "building": 5, "description": 1}
+}
 
-        for name in list(map.keys()):
-            if not collection.find_one({"_id": map[name]}):
-                del map[name]
+# Exact match filters accepted by /search for each type, each backed by a compound index
+search_filters = {
+    "restaurant" : ["dining_hall", "cuisine", "building"],
+    "club" : ["college"],
+    "studyspot" : ["building"]
+}
+
+# One-off migrations record that they finished, so later startups skip them
+def migration_done(name: str) -> bool:
+    return migrations.find_one({"_id": name}, {"_id": 1}) is not None
+
+def finish_migration(name: str):
+    migrations.update_one({"_id": name}, {"$set": {"finished": datetime.now(timezone.utc)}}, upsert=True)
 
-        map.sync()
+# Copies names from any legacy shelf onto documents that were inserted without their key field.
+# Only the _ids of documents missing the field are fetched, diffed against the shelf in memory,
+# and the changes written in one bulk write. Documents missing the field can't be found through
+# the partial unique index, so each shelf is synced once and skipped on every later startup.
+def sync_shelves():
+    print("syncing shelves with database")
+    for item_type, path in legacy_shelves.items():
+        migration = f"sync_shelf:{item_type}"
+        if not dbm.whichdb(path) or migration_done(migration):
+            continue
+        collection, key, _ = type_map[item_type]
+        with shelve.open(path, flag="r") as map:
+            names = {obj_id: name for name, obj_id in map.items()}
+
+        missing = {document["_id"] for document in collection.find({key: {"$exists": False}}, {"_id": 1})}
+        updates = [
+            UpdateOne({"_id": obj_id, key: {"$exists": False}}, {"$set": key_fields(key, names[obj_id])})
+            for obj_id in missing & names.keys()
+        ]
+        if updates:
+            collection.bulk_write(updates, ordered=False)
+        finish_migration(migration)
+        print(f"backfilled {len(updates)} {item_type} names from shelf '{path}'")
+
+# Items are looked up by their key field, so each collection gets a unique index on it.
+# The index is partial so documents still missing the field don't collide on null.
+def ensure_indexes():
+    for collection, key, _ in type_map.values():
+        try:
+            collection.create_index([(key, ASCENDING)], unique=True, partialFilterExpression={key: {"$exists": True}})
+        except OperationFailure as e:
+            print(f"Could not create unique index on {collection.name}.{key}, falling back to non-unique: {e}")
+            collection.create_index([(key, ASCENDING)])
+    # An owner's reviews are paged newest first with _id breaking ties, the index holds the whole
+    # sort so a page is read straight off it without sorting. It replaces an index without _id.
+    reviews.create_index([("type", ASCENDING), ("owner", ASCENDING), ("time", DESCENDING), ("_id", DESCENDING)])
+    if "type_1_owner_1_time_-1" in reviews.index_information():
+        reviews.drop_index("type_1_owner_1_time_-1")
+    for item_type, weights in search_weights.items():
+        collection = type_map[item_type][0]
+        try:
+            collection.create_index([(field, "text") for field in weights], weights=weights, name="search")
+        except OperationFailure as e:
+            print(f"Could not create text index on {collection.name}: {e}")
+        collection.create_index([("search_name", ASCENDING)])
+        for field in search_filters[item_type]:
+            collection.create_index([(field, ASCENDING), ("name", ASCENDING)])
+            collection.create_index([(field, ASCENDING), ("search_name", ASCENDING)])
+    users.create_index([("username", ASCENDING)])
+    users.create_index([("email", ASCENDING)])
+    # MongoDB deletes jobs JOB_TTL seconds after they finish, jobs still queued or running have
+    # no finished time and are kept
+    try:
+        jobs.create_index([("finished", ASCENDING)], expireAfterSeconds=JOB_TTL)
+    except OperationFailure:
+        db.command("collMod", jobs.name, index={"keyPattern": {"finished": 1}, "expireAfterSeconds": JOB_TTL})
+    menu_index.create_index([("day", ASCENDING), ("term", ASCENDING)])
+    menu_index.create_index([("restaurant", ASCENDING), ("day", ASCENDING)])
+
+# Gives documents written before search_name existed their search_name. They are found through
+# the search_name index, so once every document has one this reads nothing.
+def backfill_search_names():
+    for item_type in search_weights:
+        collection = type_map[item_type][0]
+        updates = [
+            UpdateOne({"_id": document["_id"]}, {"$set": {"search_name": search_name(document["name"])}})
+            for document in collection.find({"search_name": {"$exists": False}, "name": {"$type": "string"}}, {"name": 1})
+        ]
+        if updates:
+            collection.bulk_write(updates, ordered=False)
+            print(f"backfilled {len(updates)} {item_type} search names")
+
+# Builds the menu index from every stored menu the first time the server starts with one
+def build_menu_index():
+    if menu_index.find_one({}, {"_id": 1}) is not None:
+        return
+    operations = []
+    for restaurant in restaurants.find({"menu": {"$type": "object"}}, {"_id": 0, "name": 1, "menu": 1}):
+        operations.extend(menu_index_operations(restaurant["name"], {}, restaurant["menu"]))
+    if operations:
+        menu_index.bulk_write(operations)
+        print(f"indexed {len(operations)} menu terms")
+
+# Reviews used to be embedded in their owner's ReviewSection as well as stored in the reviews
+# collection. Sections that still carry the list get count/total seeded from it and the list
+# dropped, in one update per collection.
+def migrate_embedded_reviews():
+    for item_type in reviewed_types:
+        collection = type_map[item_type][0]
+        count = {"$ifNull": ["$reviews.count", {"$size": "$reviews.reviews"}]}
+        result = collection.update_many({"reviews.reviews": {"$type": "array"}}, [
+            {"$set": {
+                "reviews.count": count,
+                "reviews.total": {"$ifNull": ["$reviews.total", {"$multiply": ["$reviews.score", count]}]}
+            }},
+            {"$project": {"reviews.reviews": 0}}
+        ])
+        if result.modified_count:
+            print(f"moved embedded reviews out of {result.modified_count} {item_type} documents")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Route handlers are plain functions so FastAPI runs their blocking PyMongo calls in
+    # the threadpool instead of on the event loop; this caps how many run at once
+    to_thread.current_default_thread_limiter().total_tokens = DB_THREADS
+
+    start = time.perf_counter()
     sync_shelves()
+    migrate_embedded_reviews()
+    ensure_indexes()
+    backfill_search_names()
+    build_menu_index()
+    warm_dining_snapshot()
+    print(f"startup completed in {time.perf_counter() - start:.3f}s")
     yield
-    sync_shelves()
+    hasher.shutdown()
+    job_executor.shutdown(wait=False, cancel_futures=True)
 
 # Instantitate app with "lifespan" that runs on startup and shutdown
 app = FastAPI(separate_input_output_schemas=False, lifespan=lifespan)
@@ -98,8 +254,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Compresses uncached responses on the fly; cached ones already carry a Content-Encoding and
+# are passed through untouched
+app.add_middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_SIZE)
+
 # Pydantic classes for FastAPI
 class Token(BaseModel):
     access_token : str
@@ -115,6 +276,20 @@ class FilterParams(BaseModel):
     name : str
     token : Token
 
+# Page sizes for list endpoints
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+# Page size the dining page requests its restaurants in, see DiningPage.tsx
+DINING_PAGE_SIZE = MAX_PAGE_SIZE
+DEFAULT_SEARCH_SIZE = 20
+MAX_SEARCH_SIZE = 100
+# Most restaurants an open_now search reads before giving up on filling the page, since their
+# hours can only be checked here
+MAX_OPEN_NOW_SCAN = 1000
+
+# Dining hours are scraped as local wall clock times
+CAMPUS_TIMEZONE = ZoneInfo(config.get('CAMPUS_TIMEZONE') or "America/Los_Angeles")
+
 # Auth declarations
 SECRET_KEY = config['SECRET_KEY']
 ALGORITHM = "HS256"
@@ -122,75 +297,278 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 # oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
-pwd_context = CryptContext(schemes=['bcrypt'], deprecated="auto")
+hasher = PasswordHasher(HASH_WORKERS)
+
+# Users resolved from tokens, keyed by user_cache_key. Entries are dropped on PUT /user in
+# this process; other workers see the change once their entry expires.
+USER_CACHE_TTL = float(config.get('USER_CACHE_TTL') or 60)
+USER_CACHE_SIZE = int(config.get('USER_CACHE_SIZE') or 1024)
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+# Rendered list and item responses, dropped whenever their collection is written. With
+# RESPONSE_CACHE_SHARED=true the invalidations go through MongoDB so every worker sees them,
+# otherwise writes made by other processes show up once the entry expires.
+RESPONSE_CACHE_TTL = float(config.get('RESPONSE_CACHE_TTL') or 300)
+RESPONSE_CACHE_SIZE = int(config.get('RESPONSE_CACHE_SIZE') or 512)
+RESPONSE_CACHE_SHARED = (config.get('RESPONSE_CACHE_SHARED') or "").lower() == "true"
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, db.cache_versions if RESPONSE_CACHE_SHARED else None)
 
 # All database related functions
-def fetch_all(collection: Collection) -> list[dict]:
-    items = []
-    cursor = json.loads(json_util.dumps(collection.find({})))
-    for document in cursor:
-        document.pop('_id', None)
-        items.append(document)
-    return items
 
-def fetch_one(collection: Collection, map: Shelf, name: str) -> dict:
+# Builds a MongoDB projection from the ?fields= and ?view= query parameters.
+# Fields are comma separated and may use dot notation for nested fields.
+def build_projection(item_type: str, fields: Optional[str] = None, view: Optional[str] = None) -> dict:
+    projection = {"_id": 0}
+    selected = []
+
+    if view is not None and view != "full":
+        if view != "summary":
+            raise HTTPException(status_code=400, detail=f"Unknown view '{view}'")
+        selected.extend(summary_views[item_type])
+
+    if fields:
+        model = type_map[item_type][2]
+        for field in fields.split(","):
+            field = field.strip()
+            if not field:
+                continue
+            if field.split(".")[0] not in model.model_fields:
+                raise HTTPException(status_code=400, detail=f"Unknown field '{field}'")
+            selected.append(field)
+
+    # MongoDB rejects a projection holding both "reviews" and "reviews.score"
+    for field in selected:
+        parts = field.split(".")
+        if not any(".".join(parts[:i]) in selected for i in range(1, len(parts))):
+            projection[field] = 1
+    # Full documents leave out the field only kept for searching
+    if not selected:
+        projection["search_name"] = 0
+    return projection
+
+# Page cursors are the url-safe base64 of the sort key of the last item on the previous page
+def encode_cursor(*values) -> str:
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, *types) -> list:
     try:
-        obj_id = map[name]
-    except KeyError:
-        raise HTTPException(status_code=404, detail="Resource Not Found")
+        values = json_util.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if not isinstance(values, list) or len(values) != len(types) or not all(isinstance(v, t) for v, t in zip(values, types)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+# Streams one page of a collection as a chunked JSON array, ordered by _id. The
+# page boundary is found with a covered query on the _id index first, so the
+# next cursor can be sent as the X-Next-Cursor header before the body starts.
+# Documents are consumed from the cursor one at a time and _id is dropped by
+# the projection on the server, so memory use stays flat.
+def stream_all(collection: Collection, projection: dict = {"_id": 0}, limit: int = DEFAULT_PAGE_SIZE, after: Optional[str] = None) -> StreamingResponse:
+    documents, headers = find_page(collection, projection, limit, after)
+    return StreamingResponse(json_array(documents), media_type="application/json", headers=headers)
+
+# Encodes documents as the chunks of a JSON array, one document at a time
+def json_array(documents):
+    yield b"["
+    first = True
+    for document in documents:
+        if not first:
+            yield b","
+        first = False
+        yield encode_json(document)
+    yield b"]"
+
+# The cursor over one page of a collection and the headers to send with it
+def find_page(collection: Collection, projection: dict, limit: int, after: Optional[str]):
+    query = {}
+    if after is not None:
+        query["_id"] = {"$gt": decode_cursor(after, ObjectId)[0]}
+
+    headers = {}
+    bounds = list(collection.find(query, {"_id": 1}).sort("_id", 1).skip(limit - 1).limit(2))
+    if len(bounds) == 2:
+        last_id = bounds[0]["_id"]
+        query.setdefault("_id", {})["$lte"] = last_id
+        headers["X-Next-Cursor"] = encode_cursor(last_id)
+
+    return collection.find(query, projection).sort("_id", 1).limit(limit), headers
+
+# One page of a collection rendered in full, for warming the cache off the request path
+def render_page(collection: Collection, projection: dict, limit: int, after: Optional[str]):
+    documents, headers = find_page(collection, projection, limit, after)
+    return b"".join(json_array(documents)), headers
+
+def render_one(collection: Collection, key: str, name: str, projection: dict):
+    return encode_json(fetch_one(collection, key, name, projection)), {}
+
+# Cached responses are keyed on what their query parameters resolve to rather than the query
+# string, so equivalent URLs (a default limit left out or spelled out, fields listed in another
+# order or matching the full view) share one entry
+def response_key(collection: Collection, path: str, projection: dict, *params) -> tuple:
+    return (collection.name, response_cache.version(collection.name), path, tuple(sorted(projection.items())), params)
+
+# A cache entry: the digest of the body, the body, its compressed copies and its headers
+def build_entry(body: bytes, headers: dict) -> tuple:
+    return (hashlib.sha256(body).hexdigest()[:32], body, compress_variants(body, COMPRESS_MIN_SIZE), headers)
+
+# Serves a GET from the response cache, rendering it with render() on a miss. The collection
+# version is read before rendering, so a response built while a write lands is stored under the
+# old version and never served. Bodies are compressed once when cached and sent in the encoding
+# the client prefers. Every response carries a strong ETag per encoding, and a request whose
+# If-None-Match holds any of them gets an empty 304.
+def cached_response(request: Request, collection: Collection, projection: dict, render) -> Response:
+    key = response_key(collection, request.url.path, projection)
+    entry = response_cache.get(key)
+    if entry is None:
+        entry = build_entry(*render())
+        response_cache.set(key, entry)
+    return serve_entry(request, entry)
+
+# Serves a page of a collection from the response cache. On a miss the page is streamed
+# straight from the cursor like stream_all, so it never sits in memory as documents, and the
+# encoded chunks are joined into the cache entry once the last one is sent. That first response
+# has no ETag and is only compressed on the fly by GZipMiddleware, since neither can be done
+# before the body is complete; every request after it is served from the entry. A client that
+# disconnects mid-page leaves nothing cached.
+def cached_page(request: Request, collection: Collection, projection: dict, limit: int, after: Optional[str]) -> Response:
+    key = response_key(collection, request.url.path, projection, limit, after)
+    entry = response_cache.get(key)
+    if entry is not None:
+        return serve_entry(request, entry)
+
+    documents, headers = find_page(collection, projection, limit, after)
+
+    def fill():
+        chunks = []
+        for chunk in json_array(documents):
+            chunks.append(chunk)
+            yield chunk
+        response_cache.set(key, build_entry(b"".join(chunks), headers))
+
+    return StreamingResponse(fill(), media_type="application/json", headers={**headers, "Cache-Control": "no-cache"})
+
+def serve_entry(request: Request, entry: tuple) -> Response:
+    digest, body, variants, headers = entry
+    encoding = choose_encoding(request.headers.get("accept-encoding"), variants)
+    headers = {**headers, "ETag": f'"{digest}-{encoding}"' if encoding else f'"{digest}"', "Cache-Control": "no-cache"}
+    if variants:
+        headers["Vary"] = "Accept-Encoding"
+    if etag_matches(request.headers.get("if-none-match"), digest):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        body = variants[encoding]
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def etag_matches(if_none_match: Optional[str], digest: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/").strip('"').split("-")[0] for tag in if_none_match.split(",")]
+    return "*" in tags or digest in tags
+
+# Renders and compresses the first page of the restaurant list the dining page loads
+# (/restaurant/?limit=DINING_PAGE_SIZE) right after the restaurants change, so the first request
+# after a refresh is already served precompressed
+def warm_dining_snapshot():
+    projection = build_projection("restaurant")
+    key = response_key(restaurants, app.url_path_for("fetch_restaurants"), projection, DINING_PAGE_SIZE, None)
+    response_cache.set(key, build_entry(*render_page(restaurants, projection, DINING_PAGE_SIZE, None)))
+
+# Builds the query matching an item by the name used in its endpoint
+def key_query(key: str, name: str) -> dict:
+    if key == "review_id":
+        try:
+            return {key: int(name)}
+        except ValueError:
+            raise HTTPException(status_code=404, detail="Resource Not Found")
+    return {key: name}
+
+# The fields an item is stored with for the name used in its endpoint: its key, and for named
+# items the name lowercased for /search's prefix match
+def key_fields(key: str, name: str) -> dict:
+    fields = key_query(key, name)
+    if key == "name":
+        fields["search_name"] = search_name(name)
+    return fields
+
+# Names are matched case-insensitively by comparing them lowercased
+def search_name(name: str) -> str:
+    return name.casefold()
+
+def fetch_one(collection: Collection, key: str, name: str, projection: dict = {"_id": 0}) -> dict:
+    try:
+        res = collection.find_one(key_query(key, name), projection)
+    except HTTPException:
+        raise
     except Exception:
         raise HTTPException(status_code=500, detail="Server Error")
-    
-    res = json.loads(json_util.dumps(collection.find_one({"_id": obj_id})))
+
     if res is None:
         raise HTTPException(status_code=404, detail="Resource Not Found")
     
     res.pop('_id', None)
     return res
 
-def insert_new_item(collection: Collection, map: Shelf, name: str, item: BaseModel):
-    if name in map:
-        raise HTTPException(status_code=409, detail="Item already exists")
+def insert_new_item(collection: Collection, key: str, name: str, item: BaseModel):
+    document = item.model_dump()
+    document.update(key_fields(key, name))
 
-    new_id = collection.insert_one(item.model_dump()).inserted_id
-    map[name] = new_id
-    map.sync()
+    try:
+        collection.insert_one(document)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Item already exists")
+    response_cache.invalidate(collection.name)
     
     return {"message": "Success"}
 
-def update_item(collection: Collection, map: Shelf, name: str, item: BaseModel):
-    try:
-        obj_id = map[name]
-    except KeyError:
-        insert_new_item(collection, map, name, item)
-        return {"message": "Success"}
-    except Exception:
-        raise HTTPException(status_code=500, detail="Server Error")
-    
+def update_item(collection: Collection, key: str, name: str, item: BaseModel):
+    query = key_query(key, name)
+    # The review section is maintained by the review endpoints, never overwritten here
+    document = item.model_dump(exclude={"reviews"})
+    document.update(key_fields(key, name))
+
     try:
-        collection.update_one({"_id": obj_id}, {"$set": item.model_dump()})
+        collection.update_one(query, {"$set": document}, upsert=True)
     except Exception:
         raise HTTPException(status_code=500, detail="Server Error")
+    response_cache.invalidate(collection.name)
     
     return {"message": "Success"}
 
-def delete_item(collection: Collection, map: Shelf, name: str):
-    try:
-        obj_id = map[name]
-    except KeyError:
-        raise HTTPException(status_code=404, detail="Resource Not Found")
-    except Exception:
-        raise HTTPException(status_code=500, detail="Server Error")
-    
+def delete_item(collection: Collection, key: str, name: str):
+    query = key_query(key, name)
+
     try:
-        collection.delete_one({"_id": obj_id})
-        del map[name]
-        map.sync()
+        deleted = collection.delete_one(query).deleted_count
     except Exception:
         raise HTTPException(status_code=500, detail="Server Error")
+
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Resource Not Found")
+    response_cache.invalidate(collection.name)
     
     return {"message": "Success"}
 
+# Adds (sign=1) or removes (sign=-1) a review from its owner's ReviewSection with a single
+# pipeline update, so the write is atomic under concurrent posts and deletes and never
+# round-trips the whole document. count and total are stored next to score so the
+# average is updated in O(1) however many reviews the owner has.
+def adjust_review_section(review: Review, sign: int) -> bool:
+    collection, key, _ = type_map[review.type]
+    new_count = {"$max": [{"$add": [{"$ifNull": ["$reviews.count", 0]}, sign]}, 0]}
+    new_total = {"$add": [{"$ifNull": ["$reviews.total", 0]}, sign * review.rating]}
+
+    result = collection.update_one(key_query(key, review.owner), [{"$set": {"reviews": {
+        "score": {"$cond": [{"$gt": [new_count, 0]}, {"$divide": [new_total, new_count]}, 0]},
+        "count": new_count,
+        "total": {"$cond": [{"$gt": [new_count, 0]}, new_total, 0]},
+        "hidden": {"$ifNull": ["$reviews.hidden", False]}
+    }}}])
+    response_cache.invalidate(collection.name)
+    return result.matched_count > 0
+
 def transform_menu_data(menu_data):
     pass
 
@@ -199,21 +577,12 @@ def transform_hours(times_data):
 
 # Login stuff
 
-# Hash password
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
-
-# Verify password against the hash password
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
-
-def _register(user: User):
+def _check_available(user: User):
     # Check if the username or email is already in use
     if users.find_one({"username": user.username}) or users.find_one({"email": user.email}):
         raise HTTPException(status_code=400, detail="Username or email already exists")
-    
-    # Hash the password
-    hashed_password = get_password_hash(user.password)
+
+def _register(user: User, hashed_password: str):
     user_dict = user.model_dump()
     user_dict["password"] = hashed_password
 
@@ -221,9 +590,12 @@ def _register(user: User):
     users.insert_one(user_dict)
 
 # Endpoint for Post request for registering or signing in
+# Database calls go to the threadpool and bcrypt to the hashing processes
 @app.post("/register")
 async def register(user: User):
-    _register(user)
+    await run_in_threadpool(_check_available, user)
+    hashed_password = await hasher.hash(user.password)
+    await run_in_threadpool(_register, user, hashed_password)
     return {"message": "User registered successfully"}
 
 
@@ -237,16 +609,16 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 @app.post("/login", response_model=Token)
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     # Find the user by username
-    user = users.find_one({"username": form_data.username})
-    if not user and not verify_password(form_data.password, user["password"]):
+    user = await run_in_threadpool(users.find_one, {"username": form_data.username})
+    if not user or not await hasher.verify(form_data.password, user["password"]):
         raise HTTPException(
             status_code=401,
             detail="Invalid username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    # Create a JWT token
-    access_token = create_access_token(data={"sub": user["username"]})
+    # Create a JWT token, carrying the user's _id so later lookups go straight to it
+    access_token = create_access_token(data={"sub": user["username"], "uid": str(user["_id"])})
     return {"access_token": access_token, "token_type": "bearer"}
 
 def decode_token(token: str) -> Optional[dict]:
@@ -255,7 +627,20 @@ def decode_token(token: str) -> Optional[dict]:
     except PyJWTError:
         return None
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
+# Finds a user by the _id in the token, falling back to the username for tokens issued without one
+def user_query(payload: dict) -> dict:
+    if "uid" in payload:
+        return {"_id": ObjectId(payload["uid"])}
+    return {"username": payload["sub"]}
+
+# Cache key for the user a token resolves to. Usernames can change and be taken again by a
+# new account, so tokens carrying the _id are keyed by it and only legacy tokens by username.
+def user_cache_key(payload: dict) -> str:
+    if "uid" in payload:
+        return f"uid:{payload['uid']}"
+    return f"sub:{payload['sub']}"
+
+def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     payload = decode_token(token)
     if not payload:
         raise HTTPException(
@@ -263,11 +648,18 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
             detail="Invalid token",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    cached = user_cache.get(user_cache_key(payload))
+    if cached is not None:
+        return cached
     
-    user = users.find_one({"username": payload["sub"]})
+    user = users.find_one(user_query(payload))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return User(**user)
+
+    user = User(**user)
+    user_cache.set(user_cache_key(payload), user)
+    return user
 
 # This code defines a protected API endpoint (/protected) that requires authentication. 
 # It uses the get_current_user function to verify the user's token and retrieve their information. 
@@ -284,51 +676,335 @@ async def get_user(current_user: User = Depends(get_current_user)):
     return {"username": current_user.username, "email": current_user.email, "name": current_user.full_name, "user_id": current_user.user_id, "review_list": current_user.review_list}
 
 @app.put("/user")
-async def update_user_profile(user: User, current_user: User = Depends(get_current_user)):
+def update_user_profile(user: User, current_user: User = Depends(get_current_user), token: str = Depends(oauth2_scheme)):
     user.password = current_user.password
-    obj_id = users.find_one({"username": current_user.username})["_id"]
+    payload = decode_token(token)
     try:
-        users.update_one({"_id": obj_id}, {"$set": user.model_dump()})
+        users.update_one(user_query(payload), {"$set": user.model_dump()})
     except:
-        return HTTPException(500, "Error updating user.")
+        raise HTTPException(500, "Error updating user.")
+    finally:
+        user_cache.pop(user_cache_key(payload))
     return HTMLResponse("User updated.")
 
+# Background jobs run one at a time on this thread, outside any request
+job_executor = ThreadPoolExecutor(max_workers=1)
+# How long a finished job's status can still be read, in seconds
+JOB_TTL = int(config.get('JOB_TTL') or 7 * 24 * 3600)
+
+# A refresh lease older than this is assumed to belong to a crashed worker
+REFRESH_TIMEOUT = timedelta(minutes=30)
+
+# Takes the refresh lease for job_id. Returns None if it was taken, or the id of the job
+# already holding it. The upsert can only insert when no live lease matches, and the
+# fixed _id turns a concurrent claim into a DuplicateKeyError. A lease released between
+# the two is claimed again rather than reported as held.
+def claim_refresh(job_id: str) -> Optional[str]:
+    while True:
+        now = datetime.now(timezone.utc)
+        try:
+            locks.update_one(
+                {"_id": "refreshDining", "$or": [{"job_id": None}, {"expires": {"$lt": now}}]},
+                {"$set": {"job_id": job_id, "expires": now + REFRESH_TIMEOUT}},
+                upsert=True
+            )
+            return None
+        except DuplicateKeyError:
+            lock = locks.find_one({"_id": "refreshDining"})
+            if lock and lock.get("job_id"):
+                return lock["job_id"]
+
+def release_refresh(job_id: str):
+    locks.update_one({"_id": "refreshDining", "job_id": job_id}, {"$set": {"job_id": None}})
+
+def set_job(job_id: str, **fields):
+    jobs.update_one({"_id": job_id}, {"$set": fields})
+
+def fetch_job(job_id: str) -> dict:
+    job = jobs.find_one({"_id": job_id})
+    if job is None:
+        raise HTTPException(status_code=404, detail="Resource Not Found")
+    job["job_id"] = job.pop("_id")
+    return job
+
+# Works out the update that brings a stored restaurant in line with a freshly scraped one.
+# menu and schedule are compared day by day so only changed days are $set, and days no
+# longer in the scrape are $unset; other fields are $set only when they differ.
+def restaurant_diff(stored: Optional[dict], document: dict, report: dict) -> Optional[dict]:
+    if stored is None:
+        report["days_changed"] += sum(len(document[field] or {}) for field in ("menu", "schedule"))
+        return {"$set": document}
+
+    to_set = {}
+    to_unset = {}
+    for field, value in document.items():
+        if field in ("menu", "schedule") and isinstance(value, dict) and isinstance(stored.get(field), dict):
+            for day, entries in value.items():
+                if stored[field].get(day) != entries:
+                    to_set[f"{field}.{day}"] = entries
+                    report["days_changed"] += 1
+            for day in stored[field].keys() - value.keys():
+                to_unset[f"{field}.{day}"] = ""
+                report["days_removed"] += 1
+        elif stored.get(field) != value:
+            to_set[field] = value
+
+    update = {}
+    if to_set:
+        update["$set"] = to_set
+    if to_unset:
+        update["$unset"] = to_unset
+    return update or None
+
+# Writes scraped restaurants in a single unordered bulk write keyed by name, so a refresh is
+# one round trip and readers never see a restaurant missing halfway through. Stored copies
+# are read in one projected query and only the fields and days that changed are written.
+# The review section is never touched so existing scores survive the refresh.
+def upsert_restaurants(rest_list: list[dict]) -> dict:
+    report = {"written": 0, "unchanged": 0, "failed": 0, "days_changed": 0, "days_removed": 0}
+    documents = []
+    for restaurant in rest_list:
+        try:
+            transformed_data = Restaurant(
+                name = restaurant['name'],
+                image = restaurant['img_url'],
+                building = restaurant['dining_hall'],
+                location = restaurant['address'],
+                dining_hall = restaurant['dining_hall'],
+                description = restaurant['description'],
+                schedule = restaurant['schedule'],
+                menu = restaurant['menu']
+            )
+        except Exception as e:
+            print(f"Error transforming {restaurant.get('name')}: {e}")
+            report["failed"] += 1
+            continue
+        documents.append({**transformed_data.model_dump(exclude={"reviews"}), "search_name": search_name(transformed_data.name)})
+
+    stored = {
+        document["name"]: document
+        for document in restaurants.find({"name": {"$in": [d["name"] for d in documents]}}, {"_id": 0, "reviews": 0})
+    }
+
+    operations = []
+    index_operations = []
+    for document in documents:
+        previous = stored.get(document["name"])
+        update = restaurant_diff(previous, document, report)
+        if update is None:
+            report["unchanged"] += 1
+            continue
+        operations.append(UpdateOne({"name": document["name"]}, update, upsert=True))
+        index_operations.extend(menu_index_operations(document["name"], (previous or {}).get("menu"), document["menu"]))
+
+    if operations:
+        restaurants.bulk_write(operations, ordered=False)
+        report["written"] = len(operations)
+        response_cache.invalidate(restaurants.name)
+        warm_dining_snapshot()
+    if index_operations:
+        menu_index.bulk_write(index_operations)
+
+    print(f"Refreshed restaurants: {report}")
+    return report
+
+# Lowercase words of a menu item with accents stripped, "Crème Brûlée" -> ["creme", "brulee"]
+def menu_terms(text: str) -> list[str]:
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode().lower()
+    return [term for term in re.findall(r"[a-z0-9]+", text) if len(term) > 1]
+
+# Index writes that bring one restaurant's postings from its old menu to its new one. Only days
+# whose sections changed are replaced, so a refresh that changes one day rewrites one day.
+# Written with an ordered bulk write so each day's delete lands before its inserts.
+def menu_index_operations(name: str, old_menu: Optional[dict], new_menu: Optional[dict]) -> list:
+    operations = []
+    # Menus seeded by init_db are a list of sections rather than keyed by day, and were never
+    # indexed by day; drop whatever the restaurant has and index the new menu from scratch
+    if old_menu is not None and not isinstance(old_menu, dict):
+        operations.append(DeleteMany({"restaurant": name}))
+        old_menu = {}
+    old_menu = old_menu or {}
+    new_menu = new_menu if isinstance(new_menu, dict) else {}
+    for day in old_menu.keys() | new_menu.keys():
+        if old_menu.get(day) == new_menu.get(day):
+            continue
+        if day in old_menu:
+            operations.append(DeleteMany({"restaurant": name, "day": day}))
+        for section in new_menu.get(day) or []:
+            for item in section.get("items") or []:
+                for term in set(menu_terms(item)):
+                    operations.append(InsertOne({"term": term, "restaurant": name, "day": day, "section": section["title"], "item": item}))
+    return operations
+
 # change schedule and menu
-@app.get("/refreshDining")
-async def update_restaurants():
+def refresh_dining(job_id: str):
+    set_job(job_id, status="running", started=datetime.now(timezone.utc))
     try:
         scraper = DiningScraper()
-        rest_list = scraper.scrape()
-        for restaurant in rest_list:
-            try:
-                transformed_data = Restaurant(
-                    name = restaurant['name'],
-                    image = restaurant['img_url'],
-                    building = restaurant['dining_hall'],
-                    location = restaurant['address'],
-                    dining_hall = restaurant['dining_hall'],
-                    description = restaurant['description'],
-                    schedule = restaurant['schedule'],
-                    menu = restaurant['menu']
-                )
-                
-                try:
-                    if restaurant.find_one({"name": restaurant['name']}):
-                        await delete_restaurant()
-                    await insert_new_restaurant(restaurant['name'], transformed_data)
-                    print(f'Successfully inserted {restaurant["name"]}')
-                except HTTPException as http_error:
-                    print(f'HTTP Error loading {restaurant["name"]}: {http_error.detail}')
-                    return JSONResponse(content={"message": "Error loading data"}, status_code=500)
-
-            except Exception as e:
-                print(f"Error transforming data: {e}")
-                continue
+        rest_list = scraper.scrape(progress=lambda done, total: set_job(job_id, scraped=done, total=total))
+        report = upsert_restaurants(rest_list)
+        set_job(job_id, status="succeeded", finished=datetime.now(timezone.utc), pages=scraper.stats, **report)
     except Exception as e:
         print(f"Error in cron: {e}")
-        return JSONResponse(content={"message": "Error in cron"}, status_code=500)
-    return JSONResponse(content={"message": "Success"}, status_code=200)
-    
+        set_job(job_id, status="failed", finished=datetime.now(timezone.utc), error=str(e))
+    finally:
+        release_refresh(job_id)
+
+# Starts a dining refresh in the background and returns its job, or returns the job already
+# running if there is one, so repeated calls never start duplicate scrapes
+@app.get("/refreshDining", status_code=202)
+def update_restaurants():
+    # The job is recorded before its lease is claimed, so whichever job a concurrent call
+    # finds holding the lease always has a document to return
+    job_id = uuid.uuid4().hex
+    jobs.insert_one({"_id": job_id, "type": "refreshDining", "status": "queued", "created": datetime.now(timezone.utc),
+                     "scraped": 0, "total": None})
+    running = claim_refresh(job_id)
+    if running is not None:
+        jobs.delete_one({"_id": job_id})
+        return fetch_job(running)
+
+    try:
+        job_executor.submit(refresh_dining, job_id)
+    except RuntimeError:
+        release_refresh(job_id)
+        set_job(job_id, status="failed", finished=datetime.now(timezone.utc), error="Server shutting down")
+    return fetch_job(job_id)
+
+@app.get("/refreshDining/{job_id}")
+def fetch_refresh_job(job_id: str):
+    return fetch_job(job_id)
+
+# Load on the password hashing processes
+@app.get("/metrics")
+async def metrics():
+    return {"hash_workers": HASH_WORKERS, "hash_in_flight": hasher.pending, "hash_queue_depth": hasher.queue_depth()}
+
+# Whether any of a day's scraped hours ranges ("7:30 AM - 2:00 PM") contains now
+def is_open(hours: list, now: datetime) -> bool:
+    for hours_range in hours or []:
+        try:
+            opens, closes = (datetime.strptime(t.strip(), "%I:%M %p").time() for t in hours_range.split("-"))
+        except ValueError:
+            continue
+        # Ranges that close at or after midnight wrap around
+        if opens <= now.time() < closes or (closes <= opens and (now.time() >= opens or now.time() < closes)):
+            return True
+    return False
+
+# Up to limit summary results of one type, best text match first when q is given, else by name.
+# Type-ahead queries that match no whole word fall back to a case-insensitive name prefix.
+def search_type(item_type: str, q: Optional[str], filters: dict, open_now: bool, limit: int) -> list[dict]:
+    collection = type_map[item_type][0]
+    query = dict(filters)
+    projection = build_projection(item_type, view="summary")
+
+    # Only restaurants open at some point today are read, the hours are checked here
+    now = datetime.now(CAMPUS_TIMEZONE)
+    today = now.strftime("%B %d")
+    if open_now:
+        query[f"schedule.{today}"] = {"$exists": True, "$nin": ["Closed"]}
+        projection[f"schedule.{today}"] = 1
+
+    # An open_now search reads past the restaurants that are closed right now, in batches of
+    # limit and never more than MAX_OPEN_NOW_SCAN of them
+    def take(cursor) -> list[dict]:
+        results = []
+        for document in cursor.batch_size(limit).limit(MAX_OPEN_NOW_SCAN) if open_now else cursor.limit(limit):
+            if open_now and not is_open(document.pop("schedule", {}).get(today), now):
+                continue
+            document["type"] = item_type
+            results.append(document)
+            if len(results) == limit:
+                break
+        return results
+
+    if q:
+        results = take(collection.find({**query, "$text": {"$search": q}}, {**projection, "score": {"$meta": "textScore"}})
+                       .sort([("score", {"$meta": "textScore"})]))
+        if results:
+            return results
+        # Case-sensitive and anchored on the lowercased name, so it's a bounded range on the
+        # search_name indexes
+        query["search_name"] = {"$regex": f"^{re.escape(search_name(q))}"}
+        return take(collection.find(query, projection).sort("search_name", ASCENDING))
+
+    return take(collection.find(query, projection).sort("name", ASCENDING))
+
+# Ranked summary results across restaurants, clubs and study spots, or one type of them.
+# Every filter is an indexed equality match and at most limit documents are read per type
+# (MAX_OPEN_NOW_SCAN for open_now, which skips closed restaurants), so the cost doesn't grow
+# with the size of the collections.
+@app.get("/search")
+def search(item_type: Optional[str] = Query(None, alias="type"), q: Optional[str] = None, cuisine: Optional[str] = None,
+           college: Optional[str] = None, dining_hall: Optional[str] = None, building: Optional[str] = None,
+           open_now: bool = False, limit: int = Query(DEFAULT_SEARCH_SIZE, ge=1, le=MAX_SEARCH_SIZE)):
+    if item_type is not None and item_type not in search_weights:
+        raise HTTPException(status_code=400, detail=f"Unknown type '{item_type}'")
+
+    filters = {field: value for field, value in
+               {"cuisine": cuisine, "college": college, "dining_hall": dining_hall, "building": building}.items() if value is not None}
+
+    # Types that have every requested filter, only restaurants have hours to be open
+    types = [t for t in ([item_type] if item_type else search_weights)
+             if set(filters) <= set(search_filters[t]) and (not open_now or t == "restaurant")]
+    if item_type and not types:
+        raise HTTPException(status_code=400, detail=f"Unsupported filter for type '{item_type}'")
+
+    q = (q or "").strip() or None
+    results = []
+    for t in types:
+        results.extend(search_type(t, q, filters, open_now, limit))
+
+    if len(types) > 1:
+        results.sort(key=lambda document: (-document.get("score", 0), document.get("name", "")))
+        results = results[:limit]
+    return Response(content=encode_json(results), media_type="application/json")
+
+# Replaces every posting of a restaurant whose menu was written through the CRUD routes
+def reindex_menu(name: str, menu: Optional[dict]):
+    operations = [DeleteMany({"restaurant": name})] + menu_index_operations(name, {}, menu)
+    menu_index.bulk_write(operations)
+
+def menu_day(day: Optional[str]) -> str:
+    return day or datetime.now(CAMPUS_TIMEZONE).strftime("%B %d")
+
+# Where each menu item matching q is served on a day (today by default), grouped by restaurant.
+# Every word of q must match a word of the item, the last one as a prefix so results update as
+# the user types. Each word is one range scan of the (day, term) index.
+@app.get("/menu/search")
+def search_menu(q: str, day: Optional[str] = None, limit: int = Query(DEFAULT_SEARCH_SIZE, ge=1, le=MAX_SEARCH_SIZE)):
+    terms = menu_terms(q)
+    if not terms:
+        raise HTTPException(status_code=400, detail="Query has no searchable words")
+    day = menu_day(day)
+
+    matches = None
+    for i, term in enumerate(terms):
+        term_query = {"$regex": f"^{re.escape(term)}"} if i == len(terms) - 1 else term
+        found = {
+            (posting["restaurant"], posting["section"], posting["item"])
+            for posting in menu_index.find({"day": day, "term": term_query}, {"_id": 0, "restaurant": 1, "section": 1, "item": 1})
+        }
+        matches = found if matches is None else matches & found
+        if not matches:
+            break
+
+    results = {}
+    for restaurant, section, item in sorted(matches)[:limit]:
+        results.setdefault(restaurant, []).append({"section": section, "item": item})
+    return Response(content=encode_json([{"restaurant": name, "day": day, "items": items} for name, items in results.items()]),
+                    media_type="application/json")
+
+# Menu words starting with prefix on a day, for autocompleting /menu/search
+@app.get("/menu/suggest")
+def suggest_menu(prefix: str, day: Optional[str] = None, limit: int = Query(10, ge=1, le=MAX_SEARCH_SIZE)):
+    terms = menu_terms(prefix)
+    if not terms:
+        return []
+    found = menu_index.distinct("term", {"day": menu_day(day), "term": {"$regex": f"^{re.escape(terms[-1])}"}})
+    return sorted(found)[:limit]
+
 @app.get("/", response_class=HTMLResponse)
 def index(request: Request):
     return templates.TemplateResponse(
@@ -336,131 +1012,143 @@ def index(request: Request):
     )
 
 @app.get("/restaurant/")
-async def fetch_restaurants() -> list[Restaurant]:
-    return JSONResponse(content=fetch_all(restaurants))
+def fetch_restaurants(request: Request, fields: Optional[str] = None, view: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), after: Optional[str] = None) -> list[Restaurant]:
+    return cached_page(request, restaurants, build_projection("restaurant", fields, view), limit, after)
 
 @app.post("/restaurant/{restaurant_name}")
-async def insert_new_restaurant(restaurant_name: str, restaurant: Restaurant):
-    return insert_new_item(restaurants, rest_map, restaurant_name, restaurant)
+def insert_new_restaurant(restaurant_name: str, restaurant: Restaurant):
+    result = insert_new_item(restaurants, "name", restaurant_name, restaurant)
+    reindex_menu(restaurant_name, restaurant.model_dump()["menu"])
+    return result
 
 @app.get("/restaurant/{restaurant_name}")
-async def fetch_restaurant(restaurant_name: str) -> Restaurant:
-    return JSONResponse(content=fetch_one(restaurants, rest_map, restaurant_name))
+def fetch_restaurant(request: Request, restaurant_name: str, fields: Optional[str] = None, view: Optional[str] = None) -> Restaurant:
+    projection = build_projection("restaurant", fields, view)
+    return cached_response(request, restaurants, projection, lambda: render_one(restaurants, "name", restaurant_name, projection))
 
 @app.put("/restaurant/{restaurant_name}")
-async def update_restaurant(restaurant_name: str, restaurant: Restaurant):
-    return update_item(restaurants, rest_map, restaurant_name, restaurant)
+def update_restaurant(restaurant_name: str, restaurant: Restaurant):
+    result = update_item(restaurants, "name", restaurant_name, restaurant)
+    reindex_menu(restaurant_name, restaurant.model_dump()["menu"])
+    return result
 
 @app.delete("/restaurant/{restaurant_name}")
-async def delete_restaurant(restaurant_name: str):
-    return delete_item(restaurants, rest_map, restaurant_name)
+def delete_restaurant(restaurant_name: str):
+    result = delete_item(restaurants, "name", restaurant_name)
+    menu_index.delete_many({"restaurant": restaurant_name})
+    return result
 
 @app.get("/club/")
-async def fetch_clubs() -> list[Club]:
-    return JSONResponse(content=fetch_all(clubs))
+def fetch_clubs(request: Request, fields: Optional[str] = None, view: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), after: Optional[str] = None) -> list[Club]:
+    return cached_page(request, clubs, build_projection("club", fields, view), limit, after)
 
 @app.post("/club/{club_name}")
-async def insert_new_club(club_name: str, club: Club):
-    return insert_new_item(clubs, club_map, club_name, club)
+def insert_new_club(club_name: str, club: Club):
+    return insert_new_item(clubs, "name", club_name, club)
 
 @app.get("/club/{club_name}")
-async def fetch_club(club_name: str) -> Club:
-    return JSONResponse(content=fetch_one(clubs, club_map, club_name))
+def fetch_club(request: Request, club_name: str, fields: Optional[str] = None, view: Optional[str] = None) -> Club:
+    projection = build_projection("club", fields, view)
+    return cached_response(request, clubs, projection, lambda: render_one(clubs, "name", club_name, projection))
 
 @app.put("/club/{club_name}")
-async def update_club(club_name: str, club: Club):
-    return update_item(clubs, club_map, club_name, club)
+def update_club(club_name: str, club: Club):
+    return update_item(clubs, "name", club_name, club)
 
 @app.delete("/club/{club_name}")
-async def delete_club(club_name: str):
-    return delete_item(clubs, club_map, club_name)
+def delete_club(club_name: str):
+    return delete_item(clubs, "name", club_name)
 
 @app.get("/studyspot/")
-async def fetch_study_spots() -> list[StudySpot]:
-    return JSONResponse(content=fetch_all(studyspots))
+def fetch_study_spots(request: Request, fields: Optional[str] = None, view: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), after: Optional[str] = None) -> list[StudySpot]:
+    return cached_page(request, studyspots, build_projection("studyspot", fields, view), limit, after)
 
 @app.post("/studyspot/{spot_name}")
-async def insert_new_study_spot(spot_name: str, spot: StudySpot):
-    return insert_new_item(studyspots, study_map, spot_name, spot)
+def insert_new_study_spot(spot_name: str, spot: StudySpot):
+    return insert_new_item(studyspots, "name", spot_name, spot)
 
 @app.get("/studyspot/{spot_name}")
-async def fetch_study_spot(spot_name: str) -> StudySpot:
-    return JSONResponse(content=fetch_one(studyspots, study_map, spot_name))
+def fetch_study_spot(request: Request, spot_name: str, fields: Optional[str] = None, view: Optional[str] = None) -> StudySpot:
+    projection = build_projection("studyspot", fields, view)
+    return cached_response(request, studyspots, projection, lambda: render_one(studyspots, "name", spot_name, projection))
 
 @app.put("/studyspot/{spot_name}")
-async def update_study_spot(spot_name: str, spot: StudySpot):
-    return update_item(studyspots, study_map, spot_name, spot)
+def update_study_spot(spot_name: str, spot: StudySpot):
+    return update_item(studyspots, "name", spot_name, spot)
 
 @app.delete("/studyspot/{spot_name}")
-async def delete_study_spot(spot_name: str):
-    return delete_item(studyspots, study_map, spot_name)
+def delete_study_spot(spot_name: str):
+    return delete_item(studyspots, "name", spot_name)
 
 @app.get("/review/")
-async def fetch_reviews() -> list[Review]:
-    return JSONResponse(content=fetch_all(reviews))
+def fetch_reviews(fields: Optional[str] = None, view: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), after: Optional[str] = None) -> list[Review]:
+    return stream_all(reviews, build_projection("review", fields, view), limit, after)
 
 @app.post("/review/{review_id}")
-async def insert_new_review(review_id: str, review: Review):
-    
-    item_collection, item_shelf, item_type = type_map[review.type]
+def insert_new_review(review_id: str, review: Review):
 
-    # Get item related to review and update review section
-    fetched = fetch_one(item_collection, item_shelf, review.owner)
-    item = item_type(**fetched)
+    review.review_id = key_query("review_id", review_id)["review_id"]
 
-    # If no review section, add
-    if (item.reviews is None):
-        item.reviews = ReviewSection(score=review.rating, reviews=[review], hidden=False)
-    else:
-        num_review = item.reviews.reviews.__len__()
-        item.reviews.reviews.append(review)
-        # Calculate new average score
-        item.reviews.score = ((item.reviews.score * num_review) + review.rating) / (num_review + 1)
+    # The owner is checked before anything is stored, so a review is never left behind
+    # without a review section counting it
+    if review.type not in reviewed_types:
+        raise HTTPException(status_code=400, detail=f"Cannot review a '{review.type}'")
+    collection, key, _ = type_map[review.type]
+    if collection.find_one(key_query(key, review.owner), {"_id": 1}) is None:
+        raise HTTPException(status_code=404, detail="Resource Not Found")
 
-    # Update item with review added from object
-    update_item(item_collection, item_shelf, review.owner, item)
+    # Insert review first so a duplicate id never touches the owner's score
+    insert_new_item(reviews, "review_id", review_id, review)
+
+    # Then fold it into the owner's review section in one atomic update, undoing the insert
+    # if the owner was deleted in the meantime
+    if not adjust_review_section(review, 1):
+        reviews.delete_one({"review_id": review.review_id})
+        raise HTTPException(status_code=404, detail="Resource Not Found")
 
-    # Then insert review
-    return insert_new_item(reviews, review_map, review_id, review)
+    return {"message": "Success"}
 
 @app.get("/review/{review_id}")
-async def fetch_review(review_id: str) -> StudySpot:
-    return JSONResponse(content=fetch_one(reviews, review_map, review_id))
+def fetch_review(review_id: str, fields: Optional[str] = None, view: Optional[str] = None) -> StudySpot:
+    return Response(content=encode_json(fetch_one(reviews, "review_id", review_id, build_projection("review", fields, view))), media_type="application/json")
 
 @app.delete("/review/{review_id}")
-async def delete_review(review_id: str, current_user: User = Depends(get_current_user)):
+def delete_review(review_id: str, current_user: User = Depends(get_current_user)):
+    query = key_query("review_id", review_id)
 
-    fetched = fetch_one(reviews, review_map, review_id)
-    review = Review(**fetched)
-    
-    if (review.user != current_user.username):
-        return HTTPException(401, "User does not own review")
-    
-    item_collection, item_shelf, item_type = type_map[review.type]
-
-    # Get item related to review and update review section
-    fetched = fetch_one(item_collection, item_shelf, review.owner)
-    item = item_type(**fetched)
-
-    num_review = item.reviews.reviews.__len__()
-    deleted = False
-    # Iterate through all reviews in an items review section and pop
-    for idx, review in enumerate(item.reviews.reviews):
-        if review.review_id == int(review_id):
-            deleted = True
-            item.reviews.reviews.pop(idx)
-
-    if (deleted):
-        # Calculate new average score
-        if num_review == 1:
-            item.reviews.score = 0
-        else:
-            item.reviews.score = ((item.reviews.score * num_review) - review.rating) / (num_review - 1)
-    
-        # Update item with review deleted from object
-        update_item(item_collection, item_shelf, review.owner, item)
+    # Ownership check and delete happen in one indexed operation, so concurrent
+    # deletes of the same review only ever remove it (and its rating) once
+    deleted = reviews.find_one_and_delete({**query, "user": current_user.username})
+    if deleted is None:
+        if reviews.find_one(query, {"_id": 1}) is None:
+            raise HTTPException(status_code=404, detail="Resource Not Found")
+        raise HTTPException(status_code=401, detail="User does not own review")
 
-        return delete_item(reviews, review_map, review_id)
-    
-    return HTTPException(status_code=404, detail="Resource found but not deleted")
+    adjust_review_section(Review(**deleted), -1)
+
+    return {"message": "Success"}
+
+# Reviews of a single restaurant, club or study spot, newest first
+@app.get("/{item_type}/{name}/reviews")
+def fetch_owner_reviews(item_type: str, name: str, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), after: Optional[str] = None) -> list[Review]:
+    if item_type not in reviewed_types:
+        raise HTTPException(status_code=404, detail="Resource Not Found")
+
+    query = {"type": item_type, "owner": name}
+    if after is not None:
+        last_time, last_id = decode_cursor(after, str, ObjectId)
+        # The range on time bounds the index scan, the $or only filters ties within it
+        query["time"] = {"$lte": last_time}
+        query["$or"] = [{"time": {"$lt": last_time}}, {"_id": {"$lt": last_id}}]
+
+    page = list(reviews.find(query).sort([("time", DESCENDING), ("_id", DESCENDING)]).limit(limit + 1))
+
+    headers = {}
+    if len(page) > limit:
+        page = page[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(page[-1]["time"], page[-1]["_id"])
+
+    for document in page:
+        document.pop('_id', None)
+    return Response(content=encode_json(page), media_type="application/json", headers=headers)
 
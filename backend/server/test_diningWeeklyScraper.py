@@ -0,0 +1,97 @@
+import datetime
+import shutil
+import tempfile
+import time
+import unittest
+
+from diningWeeklyScraper import DiningScraper
+from scrape_fixtures import FixtureServer, menu_id
+
+# Runs the dining scraper against FixtureServer, a local copy of the UHDS pages
+class DiningScraperTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    # Unthrottled unless a test is about the rate limit
+    def scraper(self, fixture, **kwargs):
+        kwargs.setdefault("requests_per_second", 0)
+        return DiningScraper(base_url=fixture.base_url, cache_dir=self.cache_dir, **kwargs)
+
+    def test_scrape_output_in_hours_page_order(self):
+        with FixtureServer(count=12) as fixture:
+            rest_list = self.scraper(fixture).scrape()
+
+        self.assertEqual([rest["name"] for rest in rest_list], [f"Restaurant {i}" for i in range(12)])
+        today = datetime.datetime.now()
+        first = rest_list[0]
+        self.assertEqual(first["id"], str(menu_id(0)))
+        self.assertEqual(first["dining_hall"], "Hall A")
+        self.assertEqual(first["description"], "Description of restaurant 0")
+        self.assertEqual(first["address"], "0 Campus Way, Corvallis")
+        self.assertEqual(first["img_url"], "https://uhds.oregonstate.edu/img/0.jpg")
+        self.assertEqual(first["menu_url"], f"{fixture.base_url}/api/dining/weeklymenu/{menu_id(0)}/true")
+        self.assertEqual(list(first["schedule"]), [(today + datetime.timedelta(days=d)).strftime("%B %d") for d in range(3)])
+        self.assertEqual(first["schedule"][today.strftime("%B %d")], ["7:00 AM - 2:00 PM"])
+        self.assertEqual(first["menu"], {
+            "November 27": [{"title": "Lunch - November 27th", "items": ["Dish 0", "Salad"]}],
+            "November 28": [{"title": "Lunch - November 28th", "items": ["Dish 0", "Salad"]}]
+        })
+
+    def test_renamed_locations(self):
+        with FixtureServer(count=2) as fixture:
+            scraper = self.scraper(fixture)
+            rest_id_map = scraper.getRestIDMap()
+        self.assertIn("The MainSqueeze", rest_id_map)
+        self.assertIn("Bing's at Weatherford", rest_id_map)
+        self.assertNotIn("The Main Squeeze", rest_id_map)
+
+    def test_concurrency_is_bounded_by_max_workers(self):
+        with FixtureServer(count=12, delay=0.05) as fixture:
+            self.scraper(fixture, max_workers=3, requests_per_second=0).scrape()
+        self.assertGreater(fixture.max_in_flight, 1)
+        self.assertLessEqual(fixture.max_in_flight, 3)
+
+    def test_requests_to_one_host_are_rate_limited(self):
+        with FixtureServer(count=6) as fixture:
+            scraper = self.scraper(fixture, max_workers=8, requests_per_second=20)
+            # Times are taken as requests are sent rather than as they reach the server, where
+            # a busy machine can bunch them up
+            sent = []
+            get = scraper.session.get
+            scraper.session.get = lambda *args, **kwargs: sent.append(time.monotonic()) or get(*args, **kwargs)
+            start = time.monotonic()
+            scraper.scrape()
+
+        # 20 requests a second gives each request its own 50 ms slot, so the k-th request can't
+        # go out before k slots have passed
+        self.assertEqual(len(sent), len(fixture.arrivals))
+        for k, time_sent in enumerate(sorted(sent)):
+            self.assertGreaterEqual(time_sent - start, k * 0.05 - 0.001)
+
+    def test_unchanged_pages_answer_304_on_rescrape(self):
+        with FixtureServer(count=4) as fixture:
+            first = self.scraper(fixture).scrape()
+            scraper = self.scraper(fixture)
+            second = scraper.scrape()
+
+        self.assertEqual(first, second)
+        # Locations, 4 detail and 4 menu pages go through the cache; the hours page is always read
+        self.assertEqual(scraper.stats, {"fetched": 9, "not_modified": 9, "unchanged": 0, "parsed": 0})
+
+    def test_pages_without_validators_are_skipped_by_content_hash(self):
+        with FixtureServer(count=4) as fixture:
+            fixture.etags = False
+            self.scraper(fixture).scrape()
+
+            fixture.pages[f"/api/dining/weeklymenu/{menu_id(0)}/true"] = fixture.pages[f"/api/dining/weeklymenu/{menu_id(0)}/true"].replace("Dish 0", "Soup")
+            scraper = self.scraper(fixture)
+            rest_list = scraper.scrape()
+
+        self.assertEqual(scraper.stats, {"fetched": 9, "not_modified": 0, "unchanged": 8, "parsed": 1})
+        self.assertEqual(rest_list[0]["menu"]["November 27"][0]["items"], ["Soup", "Salad"])
+
+if __name__ == "__main__":
+    unittest.main()
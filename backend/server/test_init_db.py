@@ -0,0 +1,29 @@
+import os
+import unittest
+from unittest import mock
+
+import mongomock
+
+with mock.patch("dotenv.dotenv_values", return_value={"MONGODB_CONNECTSTR": "mongodb://localhost"}), \
+     mock.patch("pymongo.MongoClient", mongomock.MongoClient):
+    import init_db
+
+RESTAURANTS_JSON = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scraping", "restaurants.json")
+
+# Loads the scraped restaurants.json into an in-memory MongoDB the server has never started on
+class InitDbTest(unittest.TestCase):
+    def setUp(self):
+        self.collection = mongomock.MongoClient().campusview.restaurants
+
+    def test_seeding_twice_inserts_each_restaurant_once(self):
+        first, _, _ = init_db.load_restaurants(RESTAURANTS_JSON, self.collection, batch_size=5)
+        second, failed, _ = init_db.load_restaurants(RESTAURANTS_JSON, self.collection, batch_size=5)
+
+        names = [document["name"] for document in self.collection.find({}, {"name": 1})]
+        self.assertEqual(len(names), len(set(names)))
+        self.assertEqual(len(names), first)
+        self.assertEqual(second, 0)
+        self.assertEqual(failed, first)
+
+if __name__ == "__main__":
+    unittest.main()
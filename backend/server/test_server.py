@@ -0,0 +1,189 @@
+import functools
+import os
+import shelve
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import mongomock
+from bson import ObjectId
+from fastapi.testclient import TestClient
+
+from diningWeeklyScraper import DiningScraper
+from scrape_fixtures import FixtureServer
+
+# The server connects and reads .env when it is imported, so it is imported against an
+# in-memory MongoDB and a test config
+with mock.patch("dotenv.dotenv_values", return_value={"MONGODB_CONNECTSTR": "mongodb://localhost", "SECRET_KEY": "test"}), \
+     mock.patch("pymongo.MongoClient", mongomock.MongoClient):
+    import server
+
+# Stands in for the cursor of a $text query, which mongomock can't run: the given documents,
+# already in rank order
+class RankedCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, *args):
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def limit(self, limit):
+        return RankedCursor(self.documents[:limit])
+
+    def __iter__(self):
+        return iter([dict(document) for document in self.documents])
+
+# Runs the API against mongomock, with dining refreshes scraping FixtureServer
+class ServerTest(unittest.TestCase):
+    def setUp(self):
+        for name in server.db.list_collection_names():
+            server.db.drop_collection(name)
+        server.response_cache.entries.clear()
+        server.user_cache.clear()
+        server.ensure_indexes()
+        self.client = TestClient(server.app)
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def refresh_dining(self, fixture) -> dict:
+        scraper = functools.partial(DiningScraper, base_url=fixture.base_url, cache_dir=self.cache_dir, requests_per_second=0)
+        with mock.patch.object(server, "DiningScraper", scraper):
+            job = self.client.get("/refreshDining").json()
+            deadline = time.monotonic() + 10
+            while job["status"] in ("queued", "running") and time.monotonic() < deadline:
+                time.sleep(0.05)
+                job = self.client.get(f"/refreshDining/{job['job_id']}").json()
+        return job
+
+    # Answers $text queries on collection with ranked and records them, other queries run as usual
+    def text_search(self, collection, ranked):
+        find = collection.find
+        queries = []
+
+        def find_text(query, *args, **kwargs):
+            if "$text" not in query:
+                return find(query, *args, **kwargs)
+            queries.append(query)
+            return RankedCursor(ranked)
+
+        return mock.patch.object(collection, "find", find_text), queries
+
+    def test_dining_page_gets_the_snapshot_warmed_by_a_refresh(self):
+        with FixtureServer(count=12) as fixture:
+            job = self.refresh_dining(fixture)
+        self.assertEqual(job["status"], "succeeded")
+
+        # A miss is streamed without an ETag, only a cached entry carries one
+        response = self.client.get(f"/restaurant/?limit={server.DINING_PAGE_SIZE}", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("ETag", response.headers)
+        self.assertEqual(response.headers.get("Content-Encoding"), "gzip")
+        self.assertEqual(len(response.json()), 12)
+
+    def test_finished_refresh_jobs_expire(self):
+        with FixtureServer(count=2) as fixture:
+            finished = self.refresh_dining(fixture)
+        running = "running-job"
+        server.jobs.insert_one({"_id": running, "type": "refreshDining", "status": "running"})
+
+        # Age the finished job past JOB_TTL, MongoDB's TTL monitor then removes it
+        server.jobs.update_one({"_id": finished["job_id"]}, {"$set": {"finished": datetime.now(timezone.utc) - timedelta(seconds=server.JOB_TTL + 60)}})
+        self.assertEqual([job["_id"] for job in server.jobs.find()], [running])
+
+    def test_equivalent_list_urls_share_a_cache_entry(self):
+        server.restaurants.insert_many([{"name": f"Restaurant {i}"} for i in range(3)])
+        self.client.get("/restaurant/")
+        etag = self.client.get("/restaurant/").headers["ETag"]
+
+        for url in (f"/restaurant/?limit={server.DEFAULT_PAGE_SIZE}", "/restaurant/?fields=&view=full"):
+            self.assertEqual(self.client.get(url).headers.get("ETag"), etag)
+        self.assertNotIn("ETag", self.client.get("/restaurant/?limit=2").headers)
+
+    def test_owner_reviews_page_newest_first_through_ties(self):
+        times = ["2024-05-0%d" % (i // 3 + 1) for i in range(9)]
+        server.reviews.insert_many([
+            {"review_id": i, "type": "club", "owner": "Chess", "user": "u", "rating": 4, "time": time}
+            for i, time in enumerate(times)
+        ])
+
+        seen, after = [], None
+        while True:
+            response = self.client.get("/club/Chess/reviews", params={"limit": 2, **({"after": after} if after else {})})
+            seen.extend(review["review_id"] for review in response.json())
+            after = response.headers.get("X-Next-Cursor")
+            if after is None:
+                break
+        self.assertEqual(seen, [8, 7, 6, 5, 4, 3, 2, 1, 0])
+
+        # The page sort is entirely in the index, so MongoDB never sorts an owner's reviews
+        keys = [index["key"] for index in server.reviews.index_information().values()]
+        self.assertIn([("type", 1), ("owner", 1), ("time", -1), ("_id", -1)], keys)
+
+    def test_search_returns_text_matches_in_rank_order(self):
+        ranked = [{"name": "Chess Club", "college": "Engineering", "score": 2.5}, {"name": "Board Games", "college": "Engineering", "score": 1.2}]
+        patch, queries = self.text_search(server.clubs, ranked)
+        with patch:
+            results = self.client.get("/search", params={"type": "club", "q": "chess", "college": "Engineering"}).json()
+
+        self.assertEqual([(r["name"], r["type"]) for r in results], [("Chess Club", "club"), ("Board Games", "club")])
+        self.assertEqual(queries, [{"college": "Engineering", "$text": {"$search": "chess"}}])
+
+    def test_search_without_text_matches_falls_back_to_a_name_prefix_in_any_case(self):
+        server.clubs.insert_many([{"name": name, "college": "Engineering"} for name in ("Chess Club", "chemistry society", "Dance", "Archery")])
+        server.backfill_search_names()
+
+        patch, queries = self.text_search(server.clubs, [])
+        with patch:
+            results = self.client.get("/search", params={"type": "club", "q": "CHE"}).json()
+
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([r["name"] for r in results], ["chemistry society", "Chess Club"])
+        # search_name is only kept for querying
+        self.assertNotIn("search_name", self.client.get("/club/Chess Club").json())
+
+    def test_shelf_is_synced_once(self):
+        shelf = os.path.join(self.cache_dir, "club")
+        first, second = ObjectId(), ObjectId()
+        with shelve.open(shelf) as map:
+            map["Chess"] = first
+        server.clubs.insert_one({"_id": first})
+
+        with mock.patch.dict(server.legacy_shelves, {"club": shelf}, clear=True):
+            server.sync_shelves()
+            self.assertEqual(server.clubs.find_one({"_id": first})["name"], "Chess")
+
+            # Later startups skip the shelf rather than scan for unnamed documents again
+            with shelve.open(shelf) as map:
+                map["Dance"] = second
+            server.clubs.insert_one({"_id": second})
+            server.sync_shelves()
+        self.assertNotIn("name", server.clubs.find_one({"_id": second}))
+
+    def post_review(self, review_id, item_type, owner, rating=4):
+        return self.client.post(f"/review/{review_id}", json={
+            "review_id": review_id, "type": item_type, "owner": owner, "user": "alice", "rating": rating, "time": "2024-05-01"
+        })
+
+    def test_review_is_counted_in_its_owners_section(self):
+        server.clubs.insert_one({"name": "Chess", "reviews": {"score": 0, "count": 0, "total": 0, "hidden": False}})
+        self.assertEqual(self.post_review(1, "club", "Chess", 4).status_code, 200)
+        self.assertEqual(self.post_review(2, "club", "Chess", 2).status_code, 200)
+        self.assertEqual(server.clubs.find_one({"name": "Chess"})["reviews"], {"score": 3, "count": 2, "total": 6, "hidden": False})
+
+    def test_review_of_something_without_a_review_section_is_not_stored(self):
+        server.reviews.insert_one({"review_id": 1, "type": "club", "owner": "Chess", "user": "bob", "rating": 5, "time": "2024-05-01"})
+        self.assertEqual(self.post_review(2, "review", "1").status_code, 400)
+        self.assertEqual(self.post_review(3, "club", "No Such Club").status_code, 404)
+        self.assertEqual([review["review_id"] for review in server.reviews.find()], [1])
+        self.assertNotIn("reviews", server.reviews.find_one({"review_id": 1}))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -9,6 +9,7 @@ import { BlurView } from 'expo-blur';
 import { ClubsCard } from "./components/ClubsCard";
 import { FilterModal } from "./components/FilterModal";
 import AntDesign from '@expo/vector-icons/AntDesign';
+import { fetchAllPages } from "../../components/fetchAllPages";
 
 export default function ClubsPage() {
   const [loaded] = useFonts({
@@ -19,7 +20,7 @@ export default function ClubsPage() {
   const [text, setText] = useState('');
   const [modalVisible, setModalVisible] = useState(false);
   const [isModalVisible, setIsModalVisible] = useState(false);
-  const [clubs, setClubs] = useState([]);
+  const [clubs, setClubs] = useState<Club[]>([]);
   const [filteredClubs, setFilteredClubs] = useState<Club[]>([]);
   const [selectedClub, setSelectedClub] = useState<Club | null>(null);
   const [refreshing, setRefreshing] = useState(false);
@@ -35,8 +36,7 @@ export default function ClubsPage() {
   // Fetch club info from backend
   async function fetchClubInfo() {
     try {
-      const response = await fetch('http://34.219.195.123/club');
-      const data = await response.json();
+      const data = await fetchAllPages<Club>('http://34.219.195.123/club/?limit=500');
       setClubs(data);
       setFilteredClubs(data);
       setNumClubs(data.length);
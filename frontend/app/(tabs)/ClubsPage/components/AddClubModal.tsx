@@ -28,7 +28,8 @@ export function AddClubModal({ modalVisible, toggleModal, onRefresh, numClubs }:
     description: '',
     reviews: {
       score: 0,
-      reviews: [],
+      count: 0,
+      total: 0,
       hidden: true
     }
   });
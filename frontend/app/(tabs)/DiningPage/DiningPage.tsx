@@ -8,10 +8,11 @@ import { DiningList } from './components/DiningList';
 import type { Restaurant } from "../../types";
 import { BlurView } from 'expo-blur';
 import { useAuth } from '../_layout';
+import { fetchAllPages } from "../../components/fetchAllPages";
 
 export default function DiningPage() {
   const [text, setText] = useState('');
-  const [restaurants, setRestaurants] = useState([]);
+  const [restaurants, setRestaurants] = useState<Restaurant[]>([]);
   const [filteredRestaurants, setFilteredRestaurants] = useState<Restaurant[]>([]);
   const [selectedRestaurant, setSelectedRestaurant] = useState<Restaurant | null>(null);
   const [modalVisible, setModalVisible] = useState(false);
@@ -33,8 +34,7 @@ export default function DiningPage() {
   // Fetch dining info from backend
   async function fetchDiningInfo() {
     try {
-      const response = await fetch('http://34.219.195.123/restaurant');
-      const data = await response.json();
+      const data = await fetchAllPages<Restaurant>('http://34.219.195.123/restaurant/?limit=500');
       setRestaurants(data);
       setFilteredRestaurants(data);
     }
@@ -6,6 +6,7 @@ import type { Restaurant } from "../../../types";
 import type { Review as ReviewType } from '../../../types';
 import { Review } from './Review';
 import { getAuthToken } from '../../ProfilePage/ProfilePage';
+import { fetchAllPages } from '../../../components/fetchAllPages';
 
 export const RestaurantCard = ({ restaurant, username, isLoggedIn, setModalVisible }: { restaurant: Restaurant, username: string, isLoggedIn: boolean, setModalVisible: (visible: boolean) => void }) => {
   const [reviews, setReviews] = useState<ReviewType[]>([]);
@@ -15,29 +16,17 @@ export const RestaurantCard = ({ restaurant, username, isLoggedIn, setModalVisib
   const [reviewToEdit, setReviewToEdit] = useState<ReviewType | null>(null);
 
   // Fetch reviews on component load
-  //useEffect(() => {
-    // const fetchReviews = async () => {
-    //   try {
-    //     const response = await fetch(`http://34.219.195.123/review`);
-    //     if (!response.ok) {
-    //       throw new Error(`Error fetching reviews: ${response.statusText}`);
-    //     }
-    //     const data = await response.json();
-    //     setReviews(data);
-    //   } catch (error) {
-    //     console.error("Error fetching reviews:", error);
-    //   }
-    // };
- 
   useEffect(() => {
-    if (restaurant.reviews?.reviews) {
-      setReviews(
-        restaurant.reviews.reviews.map((review) => ({
-          ...review,
-          type: review.type as 'restaurant' | 'review' | 'studyspot' | 'club', // Ensure valid type
-        }))
-      );
-    }
+    const fetchReviews = async () => {
+      try {
+        const data = await fetchAllPages<ReviewType>(`http://34.219.195.123/restaurant/${encodeURIComponent(restaurant.name)}/reviews?limit=500`);
+        setReviews(data);
+      } catch (error) {
+        console.error("Error fetching reviews:", error);
+      }
+    };
+
+    fetchReviews();
   }, []);
 
   // Submit a new review or update
@@ -199,8 +188,8 @@ export const RestaurantCard = ({ restaurant, username, isLoggedIn, setModalVisib
 
       {/* Render Reviews */}
       <ScrollView style={styles.reviewsContainer}>
-        {restaurant.reviews && restaurant.reviews.reviews.length > 0 ? (
-          restaurant.reviews?.reviews.map((review) => (
+        {reviews.length > 0 ? (
+          reviews.map((review) => (
             <Review
               key={review.review_id}
               review={review}
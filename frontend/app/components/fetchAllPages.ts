@@ -0,0 +1,17 @@
+// List endpoints return one page at a time, with the cursor for the next page in the
+// X-Next-Cursor header. Follows the cursor until the last page and returns every item.
+export async function fetchAllPages<T>(url: string): Promise<T[]> {
+  const items: T[] = [];
+  let cursor: string | null = null;
+  do {
+    const separator = url.includes('?') ? '&' : '?';
+    const response = await fetch(cursor ? `${url}${separator}after=${encodeURIComponent(cursor)}` : url);
+    if (!response.ok) {
+      throw new Error(`Error fetching ${url}: ${response.statusText}`);
+    }
+    const page: T[] = await response.json();
+    items.push(...page);
+    cursor = response.headers.get('X-Next-Cursor');
+  } while (cursor);
+  return items;
+}
@@ -22,7 +22,8 @@ export type Review = {
 
 export interface ReviewSection {
   score: number;
-  reviews: Review[];
+  count: number;
+  total: number;
   hidden: boolean;
 }
 